@@ -13,40 +13,100 @@ created by wesc on 2014 apr 21
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
 
+from collections import deque
 from datetime import datetime
+from datetime import timedelta
+import hashlib
+import heapq
+import itertools
+import json
+import random
+import time
 
 import endpoints
 from protorpc import messages
 from protorpc import message_types
 from protorpc import remote
 
+from google.appengine.api import datastore_errors
 from google.appengine.api import memcache
 from google.appengine.api import taskqueue
+from google.appengine.datastore.datastore_query import Cursor
 from google.appengine.ext import ndb
 
+from models import AttendeeForm
+from models import AttendeeForms
 from models import ConflictException
 from models import Profile
 from models import ProfileMiniForm
 from models import ProfileForm
+from models import GroupBooking
+from models import Registration
+from models import RegistrationStatus
+from models import RegistrationTicket
+from models import RegistrationTicketForm
 from models import StringMessage
 from models import BooleanMessage
 from models import Conference
 from models import ConferenceForm
 from models import ConferenceForms
+from models import ConferenceColumns
+from models import ConferenceLookupForm
+from models import ConferenceLookupForms
 from models import ConferenceQueryForm
 from models import ConferenceQueryForms
+from models import FacetCountForms
+from models import SeatShard
 from models import TeeShirtSize
 
+from displaynames import DISPLAY_NAMES
+from facets import FACET_FIELDS
+from facets import addFacetCounts
+from facets import facetDeltas
+from facets import facetValues
+from facets import getFacetCounts
+from facets import recountFacet
+from facets import updateFacetCounts
+from filterindex import COMPARATORS
+from filterindex import CONFERENCE_INDEX
+from filterindex import matchesFilter
+from registrations import attendeeKeys
+from registrations import conferencesAttending
+from registrations import groupBookingKey
+from registrations import moveLegacyRegistrations
+from registrations import registrationKey
+from registrations import releaseGroupBookings
+from seats import SEAT_SHARDS
+from seats import addSeats
+from seats import claimOrder
+from seats import countSeats
+from seats import seatsByShard
+from seats import seatShardKeys
+from seats import splitSeats
+from textsearch import findConferences
+from txstats import instrumentedTransactional
+
 from settings import WEB_CLIENT_ID
 from settings import ANDROID_CLIENT_ID
 from settings import IOS_CLIENT_ID
 from settings import ANDROID_AUDIENCE
 
+from utils import copyPlan
 from utils import getUserId
 
 EMAIL_SCOPE = endpoints.EMAIL_SCOPE
 API_EXPLORER_CLIENT_ID = endpoints.API_EXPLORER_CLIENT_ID
 MEMCACHE_ANNOUNCEMENTS_KEY = "RECENT_ANNOUNCEMENTS"
+MEMCACHE_QUERY_VERSION_KEY = "CONFERENCE_QUERY_VERSION"
+MEMCACHE_QUERY_KEY_TPL = "CONFERENCE_QUERY:%s:%s"
+MEMCACHE_QUERY_TTL = 600
+MEMCACHE_VERSION_KEY_TPL = "VERSION:%s"
+MEMCACHE_VERSION_TTL = 3600
+# compare-and-set rounds before a contended cached version is dropped
+VERSION_CAS_ATTEMPTS = 3
+# Conference.seatsAvailable is resynced from the seat shards at most once
+# per interval (seconds) after registrations
+SEAT_SYNC_INTERVAL = 10
 ANNOUNCEMENT_TPL = ('Last chance to attend! The following conferences '
                     'are nearly sold out: %s')
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -64,21 +124,170 @@ OPERATORS = {
             'GTEQ': '>=',
             'LT':   '<',
             'LTEQ': '<=',
-            'NE':   '!='
+            'NE':   '!=',
+            'IN':   'IN'
             }
 
+# Conference properties the list views need; fetched with projection
+# queries when a field mask asks for no more than these
+SUMMARY_FIELDS = ('name', 'city', 'startDate', 'maxAttendees', 'seatsAvailable')
+
+# how the datastore answers a set of filters; see _planQuery()
+PLAN_COMPOSITE = 'composite'
+PLAN_MERGE_JOIN = 'merge_join'
+PLAN_POST_FILTER = 'post_filter'
+
+# most sub-queries an IN filter (or several) may fan out to
+MAX_FANOUT = 30
+# page token markers for an IN query's merged sub-query streams
+FANOUT_TOKEN_SEP = ','
+FANOUT_TOKEN_DONE = '.'
+
+# most websafe keys one getConferences call may ask for
+MAX_BATCH_KEYS = 100
+
+# Conferences rewritten per transaction when an organiser is renamed
+ORGANIZER_UPDATE_BATCH_SIZE = 100
+
+# Profiles per /tasks/migrate_registrations task
+MIGRATION_BATCH_SIZE = 100
+
+# Conferences per /tasks/reindex_conferences task (at most MAX_TASKS_PER_ADD)
+REINDEX_BATCH_SIZE = 100
+
+# Conferences rewritten per /tasks/backfill_weeks task, or read per
+# /tasks/backfill_facets task
+BACKFILL_BATCH_SIZE = 100
+
+# queued registrations (registerForConferenceAsync) wait in a pull queue,
+# tagged by conference, & are applied up to MAX_BATCH_REGISTRATIONS per
+# transaction; that transaction spans their Profiles & the seat shards,
+# which must stay within the 25 entity groups of an xg transaction
+REGISTRATION_QUEUE = 'registrations'
+MAX_BATCH_REGISTRATIONS = 10
+REGISTRATION_LEASE_SECONDS = 60
+# seconds registrations are gathered for before a batch is applied
+REGISTRATION_BATCH_INTERVAL = 1
+
+# most attendees one group booking may (un)register; like a queued batch,
+# their Profiles & the seat shards share one xg transaction
+MAX_GROUP_SIZE = 10
+# times a group booking re-picks seat shards that ran out meanwhile
+GROUP_CLAIM_ATTEMPTS = 3
+# most seats one user may hold through group bookings for a conference
+MAX_BOOKED_SEATS = 20
+
+# seat shard transactions of one (un)registration that may fail on
+# collisions (each after txstats' retries) before it gives up
+MAX_SEAT_COLLISIONS = 10
+
+# most conferences one createConferences call may create, and how many
+# are written per put_multi
+MAX_BULK_CONFERENCES = 500
+BULK_PUT_BATCH_SIZE = 100
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 FIELDS =    {
             'CITY': 'city',
             'TOPIC': 'topics',
             'MONTH': 'month',
             'MAX_ATTENDEES': 'maxAttendees',
+            'START_DATE': 'startDate',
+            'END_DATE': 'endDate',
+            }
+
+# parse filter values for non-string fields
+FIELD_TYPES = {
+            'month': int,
+            'maxAttendees': int,
+            'startDate': lambda value: datetime.strptime(value[:10], "%Y-%m-%d").date(),
+            'endDate': lambda value: datetime.strptime(value[:10], "%Y-%m-%d").date(),
             }
 
+# fields with a (field, name) composite index in index.yaml
+COMPOSITE_FIELDS = ('city', 'topics', 'maxAttendees')
+
+# ConferenceColumns list per ConferenceForm field; a dictionary column
+# means the list holds indexes into that dictionary
+COLUMNS = (
+    ('websafeKey', 'websafeKeys', None),
+    ('name', 'names', None),
+    ('description', 'descriptions', None),
+    ('organizerUserId', 'organizerUserIds', None),
+    ('topics', 'topics', 'topicDictionary'),
+    ('city', 'cities', 'cityDictionary'),
+    ('startDate', 'startDates', None),
+    ('month', 'months', None),
+    ('maxAttendees', 'maxAttendees', None),
+    ('seatsAvailable', 'seatsAvailable', None),
+    ('endDate', 'endDates', None),
+    ('organizerDisplayName', 'organizerDisplayNames', 'organizerDictionary'),
+)
+
+# (field name, getter) plans for the *ToForm converters, built once
+CONFERENCE_COPY_PLAN = copyPlan(Conference, ConferenceForm, {
+    'startDate': lambda conf: str(conf.startDate),
+    'endDate': lambda conf: str(conf.endDate),
+    'websafeKey': lambda conf: conf.key.urlsafe(),
+    'etag': lambda conf: str(conf.version),
+    # not indexed, so never in a projection
+    'organizerDisplayName': lambda conf:
+        None if conf._projection else conf.organizerDisplayName,
+})
+
+PROFILE_COPY_PLAN = copyPlan(Profile, ProfileForm, {
+    'teeShirtSize': lambda prof: getattr(TeeShirtSize, prof.teeShirtSize),
+    'conferenceKeysToAttend': conferencesAttending,
+    'etag': lambda prof: str(prof.version),
+})
+
 CONF_GET_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeConferenceKey=messages.StringField(1),
 )
 
+CONF_CONDITIONAL_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    ifNoneMatch=messages.StringField(2),
+)
+
+PROFILE_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    ifNoneMatch=messages.StringField(1),
+)
+
+CONF_BATCH_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKeys=messages.StringField(1, repeated=True),
+)
+
+CONF_LIST_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    fields=messages.StringField(1, repeated=True),
+)
+
+CONF_SEARCH_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    query=messages.StringField(1),
+    pageSize=messages.IntegerField(2, variant=messages.Variant.INT32),
+    pageToken=messages.StringField(3),
+    fields=messages.StringField(4, repeated=True),
+)
+
+GROUP_REGISTRATION_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    attendees=messages.StringField(2, repeated=True),
+)
+
+TICKET_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    ticket=messages.StringField(1),
+)
+
 CONF_POST_REQUEST = endpoints.ResourceContainer(
     ConferenceForm,
     websafeConferenceKey=messages.StringField(1),
@@ -95,32 +304,47 @@ class ConferenceApi(remote.Service):
 
 # - - - Conference objects - - - - - - - - - - - - - - - - -
 
-    def _copyConferenceToForm(self, conf, displayName):
+    def _copyConferenceToForm(self, conf, displayName, fields=None):
         """Copy relevant fields from Conference to ConferenceForm."""
         cf = ConferenceForm()
-        for field in cf.all_fields():
-            if hasattr(conf, field.name):
-                # convert Date to date string; just copy others
-                if field.name.endswith('Date'):
-                    setattr(cf, field.name, str(getattr(conf, field.name)))
-                else:
-                    setattr(cf, field.name, getattr(conf, field.name))
-            elif field.name == "websafeKey":
-                setattr(cf, field.name, conf.key.urlsafe())
-        if displayName:
+        for name, get in CONFERENCE_COPY_PLAN:
+            # only copy fields in the field mask, if there is one
+            if not fields or name in fields:
+                setattr(cf, name, get(conf))
+        if displayName and (not fields or 'organizerDisplayName' in fields):
             setattr(cf, 'organizerDisplayName', displayName)
         cf.check_initialized()
         return cf
 
 
-    def _createConferenceObject(self, request):
-        """Create or update Conference object, returning ConferenceForm/request."""
-        # preload necessary data items
-        user = endpoints.get_current_user()
-        if not user:
-            raise endpoints.UnauthorizedException('Authorization required')
-        user_id = getUserId(user)
+    def _copyFormsToColumns(self, conf_forms, fields=None):
+        """Copy ConferenceForms to one ConferenceColumns message."""
+        columns = ConferenceColumns(nextPageToken=conf_forms.nextPageToken)
+        for name, column, dictionary in COLUMNS:
+            # keep every list parallel: fill a column for all or none
+            if fields and name not in fields:
+                continue
+            values = [getattr(cf, name) for cf in conf_forms.items]
+            if name == 'topics':
+                setattr(columns, 'topicCounts', [len(value) for value in values])
+                values = [topic for value in values for topic in value]
+            if dictionary:
+                codes = {}
+                for value in values:
+                    codes.setdefault(value or '', len(codes))
+                setattr(columns, dictionary, sorted(codes, key=codes.get))
+                values = [codes[value or ''] for value in values]
+            else:
+                string = isinstance(ConferenceColumns.field_by_name(column), messages.StringField)
+                unset = '' if string else 0
+                values = [unset if value is None else value for value in values]
+            setattr(columns, column, values)
+        return columns
+
 
+    def _formatConferenceData(self, request):
+        """Check ConferenceForm for a new conference; return Conference
+        properties (defaults filled in on both)."""
         if not request.name:
             raise endpoints.BadRequestException("Conference 'name' field required")
 
@@ -128,6 +352,8 @@ class ConferenceApi(remote.Service):
         data = {field.name: getattr(request, field.name) for field in request.all_fields()}
         del data['websafeKey']
         del data['organizerDisplayName']
+        del data['etag']
+        del data['notModified']
 
         # add default values for those missing (both data model & outbound Message)
         for df in DEFAULTS:
@@ -147,6 +373,18 @@ class ConferenceApi(remote.Service):
         # set seatsAvailable to be same as maxAttendees on creation
         if data["maxAttendees"] > 0:
             data["seatsAvailable"] = data["maxAttendees"]
+        return data
+
+
+    def _createConferenceObject(self, request):
+        """Create or update Conference object, returning ConferenceForm/request."""
+        # preload necessary data items
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        user_id = getUserId(user)
+        data = self._formatConferenceData(request)
+
         # generate Profile Key based on user ID and Conference
         # ID based on Profile key get Conference key from ID
         p_key = ndb.Key(Profile, user_id)
@@ -154,10 +392,20 @@ class ConferenceApi(remote.Service):
         c_key = ndb.Key(Conference, c_id, parent=p_key)
         data['key'] = c_key
         data['organizerUserId'] = request.organizerUserId = user_id
+        prof = p_key.get()
+        data['organizerDisplayName'] = request.organizerDisplayName = \
+            getattr(prof, 'displayName', None)
 
         # create Conference, send email to organizer confirming
         # creation of Conference & return (modified) ConferenceForm
-        Conference(**data).put()
+        conf = Conference(**data)
+        conf.put()
+        self._cacheVersions(conf)
+        self._invalidateQueryCache()
+        updateFacetCounts(set(), facetValues(conf))
+        taskqueue.add(params={'websafeConferenceKey': c_key.urlsafe()},
+            url='/tasks/index_conference'
+        )
         taskqueue.add(params={'email': user.email(),
             'conferenceInfo': repr(request)},
             url='/tasks/send_confirmation_email'
@@ -165,7 +413,76 @@ class ConferenceApi(remote.Service):
         return request
 
 
-    @ndb.transactional()
+    def _createConferenceObjects(self, request):
+        """Create a batch of Conference objects, returning ConferenceForms."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        user_id = getUserId(user)
+        if len(request.items) > MAX_BULK_CONFERENCES:
+            raise endpoints.BadRequestException(
+                "At most %d conferences may be created at once." % MAX_BULK_CONFERENCES)
+        if not request.items:
+            return ConferenceForms()
+
+        # check the whole batch before writing any of it
+        batch = []
+        for i, form in enumerate(request.items):
+            try:
+                batch.append(self._formatConferenceData(form))
+            except (endpoints.BadRequestException, ValueError) as e:
+                raise endpoints.BadRequestException("Conference %d: %s" % (i, e))
+
+        # one RPC allocates IDs for the whole batch
+        p_key = ndb.Key(Profile, user_id)
+        first, last = Conference.allocate_ids(size=len(batch), parent=p_key)
+        prof = p_key.get()
+        confs = []
+        for c_id, data in zip(range(first, last + 1), batch):
+            data['key'] = ndb.Key(Conference, c_id, parent=p_key)
+            data['organizerUserId'] = user_id
+            data['organizerDisplayName'] = getattr(prof, 'displayName', None)
+            confs.append(Conference(**data))
+
+        # if a chunk fails, still count, index & confirm the conferences
+        # the chunks before it wrote; any the failed chunk wrote are picked
+        # up by /tasks/backfill_facets & /tasks/reindex_conferences
+        committed = []
+        try:
+            for i in range(0, len(confs), BULK_PUT_BATCH_SIZE):
+                ndb.put_multi(confs[i:i + BULK_PUT_BATCH_SIZE])
+                committed.extend(confs[i:i + BULK_PUT_BATCH_SIZE])
+        finally:
+            if committed:
+                forms = self._conferencesCreated(user, committed)
+        return ConferenceForms(items=forms)
+
+
+    def _conferencesCreated(self, user, confs):
+        """Cache, count, index & confirm newly written Conferences; return
+        their ConferenceForms."""
+        self._cacheVersions(*confs)
+        self._invalidateQueryCache()
+        deltas = {}
+        for conf in confs:
+            for facet in facetValues(conf):
+                deltas[facet] = deltas.get(facet, 0) + 1
+        addFacetCounts(deltas)
+
+        # index & email tasks for the batch, added MAX_TASKS_PER_ADD at a time
+        forms = [self._copyConferenceToForm(conf, None) for conf in confs]
+        tasks = [taskqueue.Task(params={'websafeConferenceKey': conf.key.urlsafe()},
+            url='/tasks/index_conference') for conf in confs]
+        tasks.extend(taskqueue.Task(params={'email': user.email(),
+            'conferenceInfo': repr(form)},
+            url='/tasks/send_confirmation_email') for form in forms)
+        queue = taskqueue.Queue()
+        for i in range(0, len(tasks), taskqueue.MAX_TASKS_PER_ADD):
+            queue.add(tasks[i:i + taskqueue.MAX_TASKS_PER_ADD])
+        return forms
+
+
+    @instrumentedTransactional(lambda self, request: request.websafeConferenceKey)
     def _updateConferenceObject(self, request):
         user = endpoints.get_current_user()
         if not user:
@@ -187,6 +504,9 @@ class ConferenceApi(remote.Service):
             raise endpoints.ForbiddenException(
                 'Only the owner can update the conference.')
 
+        old_facets = facetValues(conf)
+        old_max = conf.maxAttendees or 0
+
         # Not getting all the fields, so don't create a new object; just
         # copy relevant fields from ConferenceForm to Conference object
         for field in request.all_fields():
@@ -198,11 +518,38 @@ class ConferenceApi(remote.Service):
                     data = datetime.strptime(data, "%Y-%m-%d").date()
                     if field.name == 'startDate':
                         conf.month = data.month
+                # seats are counted by the seat shards once there are any
+                if field.name == 'seatsAvailable' and conf.seatShards:
+                    continue
                 # write to Conference object
                 setattr(conf, field.name, data)
+        # backfill conferences created before the organiser's name was stored
+        if not conf.organizerDisplayName:
+            conf.organizerDisplayName = DISPLAY_NAMES.resolve([user_id]).get(user_id)
         conf.put()
-        prof = ndb.Key(Profile, user_id).get()
-        return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
+        self._cacheVersions(conf)
+        ndb.get_context().call_on_commit(self._invalidateQueryCache)
+        # facet counter shards are other entity groups, and on-commit
+        # callbacks can't use the datastore: move the counts in a task
+        # that's only added if this commits
+        deltas = facetDeltas(old_facets, facetValues(conf))
+        if deltas:
+            taskqueue.add(params={'deltas': json.dumps(
+                [[field, value, delta] for (field, value), delta in deltas.items()])},
+                url='/tasks/update_facet_counts', transactional=True
+            )
+        taskqueue.add(params={'websafeConferenceKey': request.websafeConferenceKey},
+            url='/tasks/index_conference', transactional=True
+        )
+        # capacity changed: add or withdraw the difference in seats, in a
+        # task as the seat shards are other entity groups
+        delta = (conf.maxAttendees or 0) - old_max
+        if conf.seatShards and delta:
+            taskqueue.add(params={'websafeConferenceKey': request.websafeConferenceKey,
+                'shards': conf.seatShards, 'delta': delta},
+                url='/tasks/resize_seats', transactional=True
+            )
+        return self._copyConferenceToForm(conf, None)
 
 
     @endpoints.method(ConferenceForm, ConferenceForm, path='conference',
@@ -212,6 +559,13 @@ class ConferenceApi(remote.Service):
         return self._createConferenceObject(request)
 
 
+    @endpoints.method(ConferenceForms, ConferenceForms, path='conferences/bulk',
+            http_method='POST', name='createConferences')
+    def createConferences(self, request):
+        """Create new conferences in one batch."""
+        return self._createConferenceObjects(request)
+
+
     @endpoints.method(CONF_POST_REQUEST, ConferenceForm,
             path='conference/{websafeConferenceKey}',
             http_method='PUT', name='updateConference')
@@ -220,65 +574,221 @@ class ConferenceApi(remote.Service):
         return self._updateConferenceObject(request)
 
 
-    @endpoints.method(CONF_GET_REQUEST, ConferenceForm,
+    @endpoints.method(CONF_CONDITIONAL_GET_REQUEST, ConferenceForm,
             path='conference/{websafeConferenceKey}',
             http_method='GET', name='getConference')
     def getConference(self, request):
         """Return requested conference (by websafeConferenceKey)."""
+        # unchanged since the client's copy (ifNoneMatch ETag)? answer
+        # from memcache without reading the datastore
+        c_key = ndb.Key(urlsafe=request.websafeConferenceKey)
+        if self._notModified(c_key, request.ifNoneMatch):
+            return ConferenceForm(etag=request.ifNoneMatch, notModified=True)
+
         # get Conference object from request; bail if not found
-        conf = ndb.Key(urlsafe=request.websafeConferenceKey).get()
+        conf = c_key.get()
         if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s' % request.websafeConferenceKey)
-        prof = conf.key.parent().get()
+        memcache.add(MEMCACHE_VERSION_KEY_TPL % c_key.urlsafe(), conf.version,
+            time=MEMCACHE_VERSION_TTL)
+        if request.ifNoneMatch == str(conf.version):
+            return ConferenceForm(etag=request.ifNoneMatch, notModified=True)
+        names = {}
+        if not conf.organizerDisplayName:
+            names = DISPLAY_NAMES.resolve([conf.organizerUserId])
         # return ConferenceForm
-        return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
+        return self._copyConferenceToForm(conf, names.get(conf.organizerUserId))
 
 
-    @endpoints.method(message_types.VoidMessage, ConferenceForms,
+    def _notModified(self, key, etag):
+        """Return True if etag matches entity's version stamp in memcache."""
+        if not etag:
+            return False
+        version = memcache.get(MEMCACHE_VERSION_KEY_TPL % key.urlsafe())
+        return version is not None and str(version) == etag
+
+
+    @staticmethod
+    def _cacheVersions(*entities):
+        """Set entities' version stamps in memcache once their put commits."""
+        versions = dict((MEMCACHE_VERSION_KEY_TPL % entity.key.urlsafe(), entity.version)
+            for entity in entities)
+        # runs immediately outside a transaction
+        ndb.get_context().call_on_commit(
+            lambda: ConferenceApi._raiseCachedVersions(versions))
+
+
+    @staticmethod
+    def _raiseCachedVersions(versions):
+        """Raise cached version stamps ({memcache key: version}) by
+        compare-and-set, so a slower writer can't put back an older version
+        (which a client's stale ETag would then match)."""
+        client = memcache.Client()
+        for _ in range(VERSION_CAS_ATTEMPTS):
+            cached = client.get_multi(versions.keys(), for_cas=True)
+            contended = {}
+            for key, version in versions.items():
+                if key not in cached:
+                    stored = client.add(key, version, time=MEMCACHE_VERSION_TTL)
+                elif cached[key] < version:
+                    stored = client.cas(key, version, time=MEMCACHE_VERSION_TTL)
+                else:
+                    stored = True
+                if not stored:
+                    contended[key] = version
+            versions = contended
+            if not versions:
+                return
+        # still contended: drop them, to be re-read from the datastore
+        memcache.delete_multi(versions.keys())
+
+
+    @endpoints.method(CONF_BATCH_GET_REQUEST, ConferenceLookupForms,
+            path='conferences/batch',
+            http_method='GET', name='getConferences')
+    def getConferences(self, request):
+        """Return requested conferences (by websafeConferenceKeys), in order."""
+        wscks = request.websafeConferenceKeys
+        if len(wscks) > MAX_BATCH_KEYS:
+            raise endpoints.BadRequestException(
+                "At most %d conferences may be requested at once." % MAX_BATCH_KEYS)
+
+        # keys that don't parse, or aren't Conferences, are just not found
+        conf_keys = []
+        for wsck in wscks:
+            try:
+                key = ndb.Key(urlsafe=wsck)
+            except Exception:
+                key = None
+            conf_keys.append(key if key and key.kind() == 'Conference' else None)
+
+        # one get_multi for the conferences; they carry their organiser's
+        # name, except for ones not written since it was stored
+        found = [key for key in conf_keys if key]
+        confs = dict(zip(found, ndb.get_multi(found)))
+        names = DISPLAY_NAMES.resolve([conf.key.parent().id()
+            for conf in confs.values() if conf and not conf.organizerDisplayName])
+
+        items = []
+        for wsck, key in zip(wscks, conf_keys):
+            conf = confs.get(key)
+            items.append(ConferenceLookupForm(websafeConferenceKey=wsck,
+                found=conf is not None,
+                conference=self._copyConferenceToForm(conf, names.get(conf.key.parent().id()))
+                    if conf else None))
+        return ConferenceLookupForms(items=items)
+
+
+    @endpoints.method(CONF_LIST_REQUEST, ConferenceForms,
             path='getConferencesCreated',
             http_method='POST', name='getConferencesCreated')
     def getConferencesCreated(self, request):
         """Return conferences created by user."""
+        return self._getConferencesCreated(request)
+
+
+    @endpoints.method(CONF_LIST_REQUEST, ConferenceColumns,
+            path='getConferencesCreated/columns',
+            http_method='POST', name='getConferencesCreatedColumns')
+    def getConferencesCreatedColumns(self, request):
+        """Return conferences created by user, in columnar form."""
+        return self._copyFormsToColumns(self._getConferencesCreated(request),
+            self._formatFieldMask(request.fields))
+
+
+    def _getConferencesCreated(self, request):
+        """Return ConferenceForms for conferences created by user."""
         # make sure user is authed
         user = endpoints.get_current_user()
         if not user:
             raise endpoints.UnauthorizedException('Authorization required')
         user_id = getUserId(user)
+        fields = self._formatFieldMask(request.fields)
 
         # create ancestor query for all key matches for this user
-        confs = Conference.query(ancestor=ndb.Key(Profile, user_id))
-        prof = ndb.Key(Profile, user_id).get()
+        confs = Conference.query(ancestor=ndb.Key(Profile, user_id)).fetch(
+            projection=self._summaryProjection(fields, []))
         # return set of ConferenceForm objects per Conference
         return ConferenceForms(
-            items=[self._copyConferenceToForm(conf, getattr(prof, 'displayName')) for conf in confs]
+            items=self._copyConferencesToFormsAsync(confs, fields).get_result()
         )
 
 
-    def _getQuery(self, request):
-        """Return formatted query from the submitted filters."""
+    def _formatFieldMask(self, fields):
+        """Check user supplied field mask; return set of names or None for all."""
+        if not fields:
+            return None
+        names = set(field.name for field in ConferenceForm.all_fields())
+        for name in fields:
+            if name not in names:
+                raise endpoints.BadRequestException(
+                    "Field mask contains invalid field: %s" % name)
+        return set(fields)
+
+
+    def _summaryProjection(self, fields, filters):
+        """Return projection for a field mask, or None if entities are needed."""
+        # projections need a composite index over the projected properties;
+        # index.yaml only carries those for unfiltered & ancestor queries, and
+        # only over all of SUMMARY_FIELDS, so project them all whatever the
+        # mask; the form copy leaves out what the mask doesn't ask for
+        if filters:
+            return None
+        if not fields or not fields <= set(SUMMARY_FIELDS + ('websafeKey', 'organizerDisplayName')):
+            return None
+        return list(SUMMARY_FIELDS)
+
+
+    def _planQuery(self, inequality_filter, filters):
+        """Pick how the datastore should answer the formatted filters."""
+        fields = set(filtr["field"] for filtr in filters if not filtr.get("post"))
+        # a filter on one field plus the name order is served by a
+        # (field, name) composite index; see index.yaml
+        if not fields or (len(fields) == 1 and fields <= set(COMPOSITE_FIELDS)):
+            return PLAN_COMPOSITE
+        # a single field without a composite index, or equality filters on
+        # several fields (zigzag merge join): built-in single property
+        # indexes, results in key (or inequality field) order
+        if len(fields) == 1 or not inequality_filter:
+            return PLAN_MERGE_JOIN
+        # merge join on the equality filters; check the inequality here
+        return PLAN_POST_FILTER
+
+
+    def _buildQuery(self, inequality_filter, filters, plan=PLAN_COMPOSITE):
+        """Return query for already formatted filters."""
         q = Conference.query()
-        inequality_filter, filters = self._formatFilters(request.filters)
 
-        # If exists, sort on inequality filter first
-        if not inequality_filter:
-            q = q.order(Conference.name)
-        else:
+        if plan == PLAN_COMPOSITE:
+            # If exists, sort on inequality filter first
+            if not inequality_filter:
+                q = q.order(Conference.name)
+            else:
+                q = q.order(ndb.GenericProperty(inequality_filter))
+                q = q.order(Conference.name)
+        elif plan == PLAN_MERGE_JOIN and inequality_filter:
             q = q.order(ndb.GenericProperty(inequality_filter))
-            q = q.order(Conference.name)
+        elif plan == PLAN_POST_FILTER:
+            filters = [filtr for filtr in filters if filtr["operator"] == "="]
 
         for filtr in filters:
-            if filtr["field"] in ["month", "maxAttendees"]:
-                filtr["value"] = int(filtr["value"])
-            formatted_query = ndb.query.FilterNode(filtr["field"], filtr["operator"], filtr["value"])
-            q = q.filter(formatted_query)
+            # checked in memory only
+            if filtr.get("post"):
+                continue
+            # compare through the model property, which converts values
+            # (e.g. dates) to what the datastore stores
+            prop = getattr(Conference, filtr["field"])
+            if filtr["operator"] == "IN":
+                q = q.filter(prop.IN(filtr["value"]))
+            else:
+                q = q.filter(COMPARATORS[filtr["operator"]](prop, filtr["value"]))
         return q
 
 
-    def _formatFilters(self, filters):
+    def _formatFilters(self, filters, single_inequality=True):
         """Parse, check validity and format user supplied filters."""
         formatted_filters = []
-        inequality_field = None
 
         for f in filters:
             filtr = {field.name: getattr(f, field.name) for field in f.all_fields()}
@@ -289,43 +799,413 @@ class ConferenceApi(remote.Service):
             except KeyError:
                 raise endpoints.BadRequestException("Filter contains invalid field or operator.")
 
-            # Every operation except "=" is an inequality
-            if filtr["operator"] != "=":
-                # check if inequality operation has been used in previous filters
-                # disallow the filter if inequality was performed on a different field before
-                # track the field on which the inequality operation is performed
-                if inequality_field and inequality_field != filtr["field"]:
-                    raise endpoints.BadRequestException("Inequality filter is allowed on only one field.")
-                else:
-                    inequality_field = filtr["field"]
+            # IN takes its list from 'values'
+            if filtr["operator"] == "IN":
+                if not filtr["values"]:
+                    raise endpoints.BadRequestException("IN filter requires 'values'.")
+                filtr["value"] = sorted(set(filtr["values"]))
+
+            # convert values so '06' and '6' mean the same thing
+            if filtr["field"] in FIELD_TYPES:
+                convert = FIELD_TYPES[filtr["field"]]
+                try:
+                    if filtr["operator"] == "IN":
+                        filtr["value"] = sorted(set(convert(v) for v in filtr["value"]))
+                    else:
+                        filtr["value"] = convert(filtr["value"])
+                except (TypeError, ValueError):
+                    raise endpoints.BadRequestException("Filter contains invalid value.")
+
+            # the datastore runs '!=' as a '<' and a '>' query merged,
+            # which can't page with cursors; check it in memory instead
+            if filtr["operator"] == "!=":
+                filtr["post"] = True
 
             formatted_filters.append(filtr)
+
+        formatted_filters = self._bucketDateFilters(formatted_filters)
+
+        # disallow inequalities on more than one field
+        inequality_fields = self._inequalityFields(formatted_filters)
+        if len(inequality_fields) > 1 and single_inequality:
+            raise endpoints.BadRequestException("Inequality filter is allowed on only one field.")
+        inequality_field = inequality_fields[0] if inequality_fields else None
         return (inequality_field, formatted_filters)
 
 
+    def _inequalityFields(self, filters):
+        """Return fields with inequality filters the datastore has to run."""
+        fields = []
+        for filtr in filters:
+            # Every operation except "=" and "IN" is an inequality
+            if filtr["operator"] not in ("=", "IN") and not filtr.get("post"):
+                if filtr["field"] not in fields:
+                    fields.append(filtr["field"])
+        return fields
+
+
+    def _bucketDateFilters(self, filters):
+        """Add a Conference.weeks filter for date filters bounding a window."""
+        # earliest & latest day a matching conference must overlap
+        lower = upper = None
+        for filtr in filters:
+            if filtr["field"] not in ("startDate", "endDate"):
+                continue
+            operator, day = filtr["operator"], filtr["value"]
+            if operator in (">", ">=", "="):
+                day_from = day + timedelta(days=1) if operator == ">" else day
+                lower = max(lower, day_from) if lower else day_from
+            if operator in ("<", "<=", "="):
+                day_to = day - timedelta(days=1) if operator == "<" else day
+                upper = min(upper, day_to) if upper else day_to
+        if not lower or not upper:
+            return filters
+        # an empty window matches nothing; look in upper's week only and
+        # let the date filters reject what's there
+        lower = min(lower, upper)
+        weeks = range(lower.toordinal() // 7, upper.toordinal() // 7 + 1)
+        # weeks IN [...] multiplies the sub-queries other IN filters fan out to
+        fanout = len(weeks)
+        for filtr in filters:
+            if filtr["operator"] == "IN":
+                fanout *= len(filtr["value"])
+        if fanout > MAX_FANOUT:
+            return filters
+
+        # any conference in the window shares a week with it, so the
+        # datastore only needs an equality lookup on the week buckets;
+        # the exact date filters are checked in memory
+        for filtr in filters:
+            if filtr["field"] in ("startDate", "endDate"):
+                filtr["post"] = True
+        if len(weeks) == 1:
+            weeks_filter = {"field": "weeks", "operator": "=", "value": weeks[0]}
+        else:
+            weeks_filter = {"field": "weeks", "operator": "IN", "value": weeks}
+        return filters + [weeks_filter]
+
+
     @endpoints.method(ConferenceQueryForms, ConferenceForms,
             path='queryConferences',
             http_method='POST',
             name='queryConferences')
     def queryConferences(self, request):
-        """Query for conferences."""
-        conferences = self._getQuery(request)
+        """Query for conferences, one page at a time."""
+        return self._queryConferences(request)
 
-        # need to fetch organiser displayName from profiles
-        # get all keys and use get_multi for speed
-        organisers = [(ndb.Key(Profile, conf.organizerUserId)) for conf in conferences]
-        profiles = ndb.get_multi(organisers)
 
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+    @endpoints.method(ConferenceQueryForms, ConferenceColumns,
+            path='queryConferences/columns',
+            http_method='POST',
+            name='queryConferencesColumns')
+    def queryConferencesColumns(self, request):
+        """Query for conferences, one page at a time, in columnar form."""
+        return self._copyFormsToColumns(self._queryConferences(request),
+            self._formatFieldMask(request.fields))
+
+
+    def _queryConferences(self, request):
+        """Return ConferenceForms page for the submitted filters."""
+        fields = self._formatFieldMask(request.fields)
+        inequality_filter, filters = self._formatFilters(request.filters,
+            single_inequality=False)
+
+        # the datastore allows inequalities on only one field, and IN
+        # sub-queries come in name order only from a (field, name) index;
+        # answer anything else from the in-instance filter index
+        in_filters = any(filtr["operator"] == "IN" for filtr in filters)
+        if len(self._inequalityFields(filters)) > 1 or \
+                (in_filters and not self._fansOutByName(filters)):
+            forms, next_token = self._searchConferences(request, filters, fields)
+        else:
+            page_size = self._formatPageSize(request)
+            forms, next_token = self._queryConferencesAsync(
+                request, page_size, fields).get_result()
 
         # return individual ConferenceForm object per Conference
-        return ConferenceForms(
-                items=[self._copyConferenceToForm(conf, names[conf.organizerUserId]) for conf in \
-                conferences]
-        )
+        return ConferenceForms(items=forms, nextPageToken=next_token)
+
+
+    @ndb.tasklet
+    def _queryConferencesAsync(self, request, page_size, fields=None):
+        """Fetch one page of conferences and join organiser displayNames."""
+        inequality_filter, filters = self._formatFilters(request.filters)
+        projection = self._summaryProjection(fields, filters)
+
+        # identical (normalized) filter sets share cached result keys
+        cache_key = self._queryCacheKey(request, page_size, fields)
+        cached = memcache.get(cache_key)
+        if cached is not None:
+            conf_keys, next_token = cached
+            conferences = yield ndb.get_multi_async(conf_keys)
+            conferences = [conf for conf in conferences if conf]
+        elif any(filtr["operator"] == "IN" for filtr in filters):
+            conferences, next_token = yield self._fanOutQueryAsync(
+                filters, page_size, request.pageToken)
+            memcache.set(cache_key, ([conf.key for conf in conferences], next_token),
+                time=MEMCACHE_QUERY_TTL)
+        else:
+            cursor = self._formatCursor(request.pageToken)
+            plan = self._planQuery(inequality_filter, filters)
+            q = self._buildQuery(inequality_filter, filters, plan)
+            post_filter = plan == PLAN_POST_FILTER or any(filtr.get("post") for filtr in filters)
+            # filters checked here can drop rows, so read on until the page
+            # is full (or the query runs out) & resume after the last row used
+            it = q.iter(start_cursor=cursor, produce_cursors=True,
+                batch_size=page_size, projection=projection)
+            conferences = []
+            while len(conferences) < page_size and (yield it.has_next_async()):
+                conf = it.next()
+                if not post_filter or all(matchesFilter(conf, filtr) for filtr in filters):
+                    conferences.append(conf)
+            more = yield it.has_next_async()
+            next_token = it.cursor_after().urlsafe() if more else None
+            memcache.set(cache_key, ([conf.key for conf in conferences], next_token),
+                time=MEMCACHE_QUERY_TTL)
+
+        forms = yield self._copyConferencesToFormsAsync(conferences, fields)
+        raise ndb.Return((forms, next_token))
+
+
+    def _fansOutByName(self, filters):
+        """Return True if IN filters can fan out to sub-queries in name
+        order: a single IN filter on a field with a (field, name) index,
+        plus any filters checked in memory."""
+        query_filters = [filtr for filtr in filters if not filtr.get("post")]
+        return len(query_filters) == 1 and query_filters[0]["operator"] == "IN" \
+            and query_filters[0]["field"] in COMPOSITE_FIELDS
+
+
+    @ndb.tasklet
+    def _fanOutQueryAsync(self, filters, page_size, page_token):
+        """Run one sub-query per IN value concurrently; merge them into one
+        de-duplicated page, returning (conferences, next page token)."""
+        # expand every IN filter into its '=' alternatives
+        alternatives = []
+        for filtr in filters:
+            if filtr["operator"] == "IN":
+                alternatives.append([dict(filtr, operator="=", value=value)
+                    for value in filtr["value"]])
+            else:
+                alternatives.append([filtr])
+        sub_filters = [list(combo) for combo in itertools.product(*alternatives)]
+        if len(sub_filters) > MAX_FANOUT:
+            raise endpoints.BadRequestException(
+                "IN filters may expand to at most %d queries." % MAX_FANOUT)
+        cursors = self._formatFanOutToken(page_token, len(sub_filters))
+
+        # each sub-query has a (field, name) index (see _fansOutByName), so
+        # the streams merge by name; filters checked in memory are skipped
+        # by _buildQuery & checked as the streams advance
+        iterators = []
+        for sub, cursor in zip(sub_filters, cursors):
+            q = self._buildQuery(None, sub).order(Conference.key)
+            iterators.append(None if cursor == FANOUT_TOKEN_DONE else
+                q.iter(start_cursor=cursor, produce_cursors=True, batch_size=page_size))
+
+        heads = []
+
+        @ndb.tasklet
+        def advance(i):
+            """Push the next matching Conference of stream i onto heads."""
+            it = iterators[i]
+            while (yield it.has_next_async()):
+                conf = it.next()
+                if all(matchesFilter(conf, filtr) for filtr in sub_filters[i]):
+                    heapq.heappush(heads, ((conf.name, conf.key), i, conf))
+                    return
+            cursors[i] = FANOUT_TOKEN_DONE
+
+        # start every sub-query at once
+        yield [advance(i) for i, it in enumerate(iterators) if it]
+
+        conferences = []
+        last_key = None
+        while heads:
+            sort_key, i, conf = heads[0]
+            # the same Conference can come from several streams; always
+            # consume those so it isn't repeated on the next page
+            if conf.key != last_key:
+                if len(conferences) == page_size:
+                    break
+                conferences.append(conf)
+                last_key = conf.key
+            heapq.heappop(heads)
+            cursors[i] = iterators[i].cursor_after()
+            yield advance(i)
+
+        next_token = None
+        if heads:
+            next_token = FANOUT_TOKEN_SEP.join(
+                FANOUT_TOKEN_DONE if cursor == FANOUT_TOKEN_DONE else
+                (cursor.urlsafe() if cursor else '') for cursor in cursors)
+        raise ndb.Return((conferences, next_token))
+
+
+    def _formatFanOutToken(self, page_token, size):
+        """Return per sub-query start Cursors from an IN query's page token."""
+        if not page_token:
+            return [None] * size
+        tokens = page_token.split(FANOUT_TOKEN_SEP)
+        if len(tokens) != size:
+            raise endpoints.BadRequestException("Invalid 'pageToken'.")
+        return [token if token == FANOUT_TOKEN_DONE else self._formatCursor(token)
+            for token in tokens]
+
+
+    @endpoints.method(CONF_SEARCH_REQUEST, ConferenceForms,
+            path='conferences/search',
+            http_method='GET', name='searchConferences')
+    def searchConferences(self, request):
+        """Full-text search of conference names, descriptions & topics."""
+        fields = self._formatFieldMask(request.fields)
+        page_size = self._formatPageSize(request)
+        offset = self._formatOffset(request.pageToken)
+
+        conf_keys = findConferences(request.query)
+        conferences = ndb.get_multi(conf_keys[offset:offset + page_size])
+        forms = self._copyConferencesToFormsAsync(
+            [conf for conf in conferences if conf], fields).get_result()
+        more = len(conf_keys) > offset + page_size
+        return ConferenceForms(items=forms,
+            nextPageToken=str(offset + page_size) if more else None)
+
+
+    def _searchConferences(self, request, filters, fields=None):
+        """Return page of conferences for inequalities on several fields."""
+        page_size = self._formatPageSize(request)
+        offset = self._formatOffset(request.pageToken)
+
+        # instances that got no warmup request load the index on first use
+        if CONFERENCE_INDEX.ensureLoaded():
+            CONFERENCE_INDEX.refresh()
+            conf_keys = CONFERENCE_INDEX.search(filters)
+            more = len(conf_keys) > offset + page_size
+            conferences = ndb.get_multi(conf_keys[offset:offset + page_size])
+            conferences = [conf for conf in conferences if conf]
+        else:
+            # another request is loading the index: let the datastore
+            # handle the equality & IN filters
+            # (or else the first inequality field) and check the rest here
+            query_filters = [filtr for filtr in filters if filtr["operator"] in ("=", "IN")
+                and not filtr.get("post")]
+            if query_filters:
+                q = self._buildQuery(None, query_filters, PLAN_MERGE_JOIN)
+            else:
+                inequality_filter = self._inequalityFields(filters)[0]
+                q = self._buildQuery(inequality_filter, [filtr for filtr in filters
+                    if filtr["field"] == inequality_filter], PLAN_MERGE_JOIN)
+            conferences = [conf for conf in q
+                if all(matchesFilter(conf, filtr) for filtr in filters)]
+            conferences.sort(key=lambda conf: (conf.name, conf.key))
+            more = len(conferences) > offset + page_size
+            conferences = conferences[offset:offset + page_size]
+
+        forms = self._copyConferencesToFormsAsync(conferences, fields).get_result()
+        return (forms, str(offset + page_size) if more else None)
+
+
+    @ndb.tasklet
+    def _copyConferencesToFormsAsync(self, conferences, fields=None):
+        """Copy Conferences to ConferenceForms, joining organiser displayNames."""
+        forms = [self._copyConferenceToForm(conf, None, fields) for conf in conferences]
+
+        # Conferences carry their organiser's displayName; projections, and
+        # ones not written since it was stored, need it from the profile
+        # (the parent of each Conference)
+        if not fields or 'organizerDisplayName' in fields:
+            missing = [(conf, form) for conf, form in zip(conferences, forms)
+                if not form.organizerDisplayName]
+            if missing:
+                names = yield DISPLAY_NAMES.resolveAsync(
+                    [conf.key.parent().id() for conf, form in missing])
+                for conf, form in missing:
+                    form.organizerDisplayName = names.get(conf.key.parent().id())
+
+        raise ndb.Return(forms)
+
+
+    def _queryCacheKey(self, request, page_size, fields=None):
+        """Return memcache key for a normalized filter set & page."""
+        inequality_filter, filters = self._formatFilters(request.filters)
+        signature = sorted(set((filtr["field"], filtr["operator"],
+            tuple(filtr["value"]) if filtr["operator"] == "IN" else filtr["value"])
+            for filtr in filters))
+        mask = sorted(fields) if fields else None
+        digest = hashlib.md5(repr((signature, page_size, request.pageToken, mask))).hexdigest()
+        return MEMCACHE_QUERY_KEY_TPL % (self._queryCacheVersion(), digest)
+
+
+    @staticmethod
+    def _queryCacheVersion():
+        """Return current version tag for cached conference queries."""
+        version = memcache.get(MEMCACHE_QUERY_VERSION_KEY)
+        if version is None:
+            # seed with a timestamp so an evicted tag never reuses an old one
+            memcache.add(MEMCACHE_QUERY_VERSION_KEY, int(time.time()))
+            version = memcache.get(MEMCACHE_QUERY_VERSION_KEY)
+        return version
+
+
+    @staticmethod
+    def _invalidateQueryCache():
+        """Bump version tag so all cached conference queries are stale."""
+        if memcache.incr(MEMCACHE_QUERY_VERSION_KEY) is None:
+            memcache.set(MEMCACHE_QUERY_VERSION_KEY, int(time.time()))
+
+
+    def _formatPageSize(self, request):
+        """Return page size from the submitted paging fields."""
+        page_size = request.pageSize or DEFAULT_PAGE_SIZE
+        if page_size < 0:
+            raise endpoints.BadRequestException("'pageSize' must be positive.")
+        return min(page_size, MAX_PAGE_SIZE)
+
+
+    def _formatOffset(self, page_token):
+        """Return result offset from the submitted page token."""
+        try:
+            offset = int(page_token or 0)
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            raise endpoints.BadRequestException("Invalid 'pageToken'.")
+        return offset
+
+
+    def _formatCursor(self, page_token):
+        """Return start Cursor from the submitted page token."""
+        if not page_token:
+            return None
+        try:
+            return Cursor(urlsafe=page_token)
+        except Exception:
+            raise endpoints.BadRequestException("Invalid 'pageToken'.")
+
+
+    @endpoints.method(FacetCountForms, FacetCountForms,
+            path='conferences/facets',
+            http_method='POST', name='getConferenceFacets')
+    def getConferenceFacets(self, request):
+        """Return number of conferences for each requested field & value."""
+        facets = []
+        for item in request.items:
+            field = FIELDS.get(item.field)
+            if field not in FACET_FIELDS:
+                raise endpoints.BadRequestException(
+                    "Facet field must be one of CITY, TOPIC or MONTH.")
+            value = item.value
+            if field in FIELD_TYPES:
+                try:
+                    value = FIELD_TYPES[field](value)
+                except (TypeError, ValueError):
+                    raise endpoints.BadRequestException("Facet contains invalid value.")
+            facets.append((field, value))
+
+        counts = getFacetCounts(facets)
+        for item, facet in zip(request.items, facets):
+            item.count = counts[facet]
+        return request
 
 
 # - - - Profile objects - - - - - - - - - - - - - - - - - - -
@@ -334,13 +1214,8 @@ class ConferenceApi(remote.Service):
         """Copy relevant fields from Profile to ProfileForm."""
         # copy relevant fields from Profile to ProfileForm
         pf = ProfileForm()
-        for field in pf.all_fields():
-            if hasattr(prof, field.name):
-                # convert t-shirt string to Enum; just copy others
-                if field.name == 'teeShirtSize':
-                    setattr(pf, field.name, getattr(TeeShirtSize, getattr(prof, field.name)))
-                else:
-                    setattr(pf, field.name, getattr(prof, field.name))
+        for name, get in PROFILE_COPY_PLAN:
+            setattr(pf, name, get(prof))
         pf.check_initialized()
         return pf
 
@@ -365,6 +1240,7 @@ class ConferenceApi(remote.Service):
                 teeShirtSize = str(TeeShirtSize.NOT_SPECIFIED),
             )
             profile.put()
+            self._cacheVersions(profile)
 
         return profile      # return Profile
 
@@ -379,23 +1255,182 @@ class ConferenceApi(remote.Service):
             for field in ('displayName', 'teeShirtSize'):
                 if hasattr(save_request, field):
                     val = getattr(save_request, field)
-                    if val:
+                    # unchanged: nothing to write or fan out
+                    if val and str(val) != getattr(prof, field):
                         setattr(prof, field, str(val))
                         #if field == 'teeShirtSize':
                         #    setattr(prof, field, str(val).upper())
                         #else:
                         #    setattr(prof, field, val)
                         prof.put()
+                        self._cacheVersions(prof)
+                        if field == 'displayName':
+                            DISPLAY_NAMES.update(prof.key.id(), prof.displayName)
+                            # copy new name onto the user's conferences
+                            taskqueue.add(params={'userId': prof.key.id()},
+                                url='/tasks/update_organizer_name'
+                            )
 
         # return ProfileForm
         return self._copyProfileToForm(prof)
 
 
-    @endpoints.method(message_types.VoidMessage, ProfileForm,
+    @staticmethod
+    def _updateOrganizerDisplayName(user_id):
+        """Copy organiser's current displayName onto all their Conferences;
+        used by /tasks/update_organizer_name.
+        """
+        p_key = ndb.Key(Profile, user_id)
+        cursor, more = None, True
+        while more:
+            conf_keys, cursor, more = Conference.query(ancestor=p_key).fetch_page(
+                ORGANIZER_UPDATE_BATCH_SIZE, start_cursor=cursor, keys_only=True)
+            if conf_keys:
+                ConferenceApi._updateOrganizerDisplayNameBatch(p_key, conf_keys)
+
+
+    @staticmethod
+    @ndb.transactional()
+    def _updateOrganizerDisplayNameBatch(p_key, conf_keys):
+        """Rewrite one batch of an organiser's Conferences in one transaction
+        (they share the Profile's entity group), so concurrent updates
+        aren't overwritten & the name read is the latest.
+        """
+        prof = p_key.get()
+        name = getattr(prof, 'displayName', None)
+        stale = [conf for conf in ndb.get_multi(conf_keys)
+            if conf and conf.organizerDisplayName != name]
+        for conf in stale:
+            conf.organizerDisplayName = name
+        if stale:
+            ndb.put_multi(stale)
+            ConferenceApi._cacheVersions(*stale)
+
+
+    @staticmethod
+    def _migrateRegistrations(cursor=None):
+        """Move one page of Profiles' conferenceKeysToAttend into
+        Registrations, then queue the next page; used by
+        /tasks/migrate_registrations.
+        """
+        profs, cursor, more = Profile.query().fetch_page(
+            MIGRATION_BATCH_SIZE, start_cursor=cursor, keys_only=True)
+        for p_key in profs:
+            ConferenceApi._migrateProfileRegistrations(p_key)
+        if more and cursor:
+            taskqueue.add(params={'cursor': cursor.urlsafe()},
+                url='/tasks/migrate_registrations'
+            )
+
+
+    @staticmethod
+    @ndb.transactional()
+    def _migrateProfileRegistrations(p_key):
+        """Move one Profile's conferenceKeysToAttend into Registrations."""
+        prof = p_key.get()
+        if prof and prof.conferenceKeysToAttend:
+            ndb.put_multi([prof] + moveLegacyRegistrations(prof))
+            ConferenceApi._cacheVersions(prof)
+
+
+    @staticmethod
+    def _reindexConferences(cursor=None):
+        """Queue full-text index updates for one page of Conferences,
+        then queue the next page; used by /tasks/reindex_conferences.
+        """
+        conf_keys, cursor, more = Conference.query().fetch_page(
+            REINDEX_BATCH_SIZE, start_cursor=cursor, keys_only=True)
+        if conf_keys:
+            taskqueue.Queue().add([taskqueue.Task(
+                params={'websafeConferenceKey': conf_key.urlsafe()},
+                url='/tasks/index_conference') for conf_key in conf_keys])
+        if more and cursor:
+            taskqueue.add(params={'cursor': cursor.urlsafe()},
+                url='/tasks/reindex_conferences'
+            )
+
+
+    @staticmethod
+    def _backfillWeeks(cursor=None):
+        """Rewrite one page of Conferences so their computed weeks buckets
+        are stored, then queue the next page; used by /tasks/backfill_weeks.
+        """
+        conf_keys, cursor, more = Conference.query().fetch_page(
+            BACKFILL_BATCH_SIZE, start_cursor=cursor, keys_only=True)
+        for conf_key in conf_keys:
+            ConferenceApi._rewriteConference(conf_key)
+        if more and cursor:
+            taskqueue.add(params={'cursor': cursor.urlsafe()},
+                url='/tasks/backfill_weeks'
+            )
+
+
+    @staticmethod
+    def _backfillFacets(run, cursor=None):
+        """Queue a recount of every facet value one page of Conferences is
+        counted under, then queue the next page; used by
+        /tasks/backfill_facets. Recount tasks are named per run, so each
+        facet value is recounted once however many pages it appears on.
+        """
+        confs, cursor, more = Conference.query().fetch_page(
+            BACKFILL_BATCH_SIZE, start_cursor=cursor)
+        facets = set()
+        for conf in confs:
+            facets |= facetValues(conf)
+        for field, value in facets:
+            digest = hashlib.md5(('%s|%s' % (field, value)).encode('utf-8')).hexdigest()
+            try:
+                taskqueue.add(params={'field': field, 'value': value},
+                    url='/tasks/recount_facet',
+                    name='recount_facet-%s-%s' % (run, digest)
+                )
+            except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+                pass
+        if more and cursor:
+            taskqueue.add(params={'run': run, 'cursor': cursor.urlsafe()},
+                url='/tasks/backfill_facets'
+            )
+
+
+    @staticmethod
+    def _recountFacet(field, value):
+        """Recount one facet value (as task parameter strings); used by
+        /tasks/recount_facet.
+        """
+        if field in FIELD_TYPES:
+            value = FIELD_TYPES[field](value)
+        recountFacet(field, value)
+
+
+    @staticmethod
+    @ndb.transactional()
+    def _rewriteConference(conf_key):
+        """Put a Conference back unchanged, storing its computed properties."""
+        conf = conf_key.get()
+        if conf:
+            conf.put()
+            ConferenceApi._cacheVersions(conf)
+
+
+    @endpoints.method(PROFILE_GET_REQUEST, ProfileForm,
             path='profile', http_method='GET', name='getProfile')
     def getProfile(self, request):
         """Return user profile."""
-        return self._doProfile()
+        # unchanged since the client's copy (ifNoneMatch ETag)? answer
+        # from memcache without reading the datastore
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        p_key = ndb.Key(Profile, getUserId(user))
+        if self._notModified(p_key, request.ifNoneMatch):
+            return ProfileForm(etag=request.ifNoneMatch, notModified=True)
+
+        pf = self._doProfile()
+        memcache.add(MEMCACHE_VERSION_KEY_TPL % p_key.urlsafe(), int(pf.etag),
+            time=MEMCACHE_VERSION_TTL)
+        if request.ifNoneMatch == pf.etag:
+            return ProfileForm(etag=request.ifNoneMatch, notModified=True)
+        return pf
 
 
     @endpoints.method(ProfileMiniForm, ProfileForm,
@@ -442,12 +1477,8 @@ class ConferenceApi(remote.Service):
 
 # - - - Registration - - - - - - - - - - - - - - - - - - - -
 
-    @ndb.transactional(xg=True)
     def _conferenceRegistration(self, request, reg=True):
         """Register or unregister user for selected conference."""
-        retval = None
-        prof = self._getProfileFromUser() # get user Profile
-
         # check if conf exists given websafeConfKey
         # get conference; check that it exists
         wsck = request.websafeConferenceKey
@@ -455,63 +1486,505 @@ class ConferenceApi(remote.Service):
         if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s' % wsck)
+        if not conf.seatShards:
+            conf = self._shardSeats(conf.key)
+
+        # register: claim a seat from a shard that has one left, trying
+        # the next if another registration took its last seat meanwhile,
+        # or kept colliding with this one (that shard is tried again last)
+        collisions = 0
+        if reg:
+            retval = None
+            shard_keys = deque(claimOrder(conf.key, conf.seatShards))
+            while shard_keys:
+                shard_key = shard_keys.popleft()
+                try:
+                    retval = self._seatTransaction(wsck, shard_key, reg)
+                except datastore_errors.TransactionFailedError:
+                    collisions += 1
+                    if collisions > MAX_SEAT_COLLISIONS:
+                        raise
+                    shard_keys.append(shard_key)
+                    continue
+                if retval is not None:
+                    break
+            else:
+                raise ConflictException(
+                    "There are no seats available.")
+
+        # unregister: give the seat back to any shard, picking another
+        # after a collision
+        else:
+            shard_keys = seatShardKeys(conf.key, conf.seatShards)
+            while True:
+                try:
+                    retval = self._seatTransaction(wsck, random.choice(shard_keys), reg)
+                    break
+                except datastore_errors.TransactionFailedError:
+                    collisions += 1
+                    if collisions > MAX_SEAT_COLLISIONS:
+                        raise
+
+        if retval:
+            self._scheduleSeatSync(conf.key)
+        return BooleanMessage(data=retval)
+
+
+    @instrumentedTransactional(lambda self, wsck, *args: wsck, xg=True)
+    def _seatTransaction(self, wsck, shard_key, reg):
+        """Move a seat between a seat shard & user's Registration; return
+        None if the shard has no seat left to register with."""
+        prof = self._getProfileFromUser() # get user Profile
+        shard = shard_key.get()
+        # registrations still listed in the Profile move out as it's written
+        moved = moveLegacyRegistrations(prof)
+        reg_key = registrationKey(prof.key, wsck)
+        registration = next((r for r in moved if r.key == reg_key), None) or reg_key.get()
+        registered = registration is not None
 
         # register
         if reg:
             # check if user already registered otherwise add
-            if wsck in prof.conferenceKeysToAttend:
+            if registered:
                 raise ConflictException(
                     "You have already registered for this conference")
 
             # check if seats avail
-            if conf.seatsAvailable <= 0:
-                raise ConflictException(
-                    "There are no seats available.")
+            if not shard or shard.seats <= 0:
+                return None
 
             # register user, take away one seat
-            prof.conferenceKeysToAttend.append(wsck)
-            conf.seatsAvailable -= 1
-            retval = True
+            moved.append(Registration(key=reg_key, conferenceKey=ndb.Key(urlsafe=wsck)))
+            shard.seats -= 1
 
         # unregister
         else:
             # check if user already registered
-            if wsck in prof.conferenceKeysToAttend:
+            if not registered:
+                return False
 
-                # unregister user, add back one seat
-                prof.conferenceKeysToAttend.remove(wsck)
-                conf.seatsAvailable += 1
-                retval = True
-            else:
-                retval = False
+            # unregister user, add back one seat (& to whoever booked it)
+            moved = [r for r in moved if r.key != reg_key]
+            moved.extend(releaseGroupBookings(wsck, [registration]))
+            reg_key.delete()
+            shard = shard or SeatShard(key=shard_key)
+            shard.seats += 1
 
-        # write things back to the datastore & return
-        prof.put()
-        conf.put()
+        # write things back to the datastore & return; the Profile write
+        # bumps its version (ETag), as its conferenceKeysToAttend changed
+        ndb.put_multi([prof, shard] + moved)
+        self._cacheVersions(prof)
+        return True
+
+
+    @ndb.transactional(xg=True)
+    def _shardSeats(self, conf_key):
+        """Move a conference's seatsAvailable into seat shards, once."""
+        conf = conf_key.get()
+        if not conf.seatShards:
+            conf.seatShards = SEAT_SHARDS
+            ndb.put_multi([conf] + splitSeats(conf_key, conf.seatsAvailable or 0))
+            self._cacheVersions(conf)
+        return conf
+
+
+    def _resizeSeats(self, conf_key, shards, delta):
+        """Add (or withdraw) seats after a change of maxAttendees; used by
+        /tasks/resize_seats."""
+        addSeats(conf_key, shards, delta)
+        self._scheduleSeatSync(conf_key)
+
+
+    def _scheduleSeatSync(self, conf_key):
+        """Resync Conference.seatsAvailable at the end of this interval."""
+        self._addIntervalTask('/tasks/sync_seats', conf_key, SEAT_SYNC_INTERVAL)
+
+
+    def _addIntervalTask(self, url, conf_key, interval):
+        """Add a task for a conference to run at the end of the current
+        interval (seconds); later calls in the same interval share it."""
+        bucket = int(time.time()) // interval
+        try:
+            taskqueue.add(params={'websafeConferenceKey': conf_key.urlsafe()},
+                url=url,
+                name='%s-%s-%d' % (url.rsplit('/', 1)[-1], conf_key.urlsafe(), bucket),
+                eta=datetime.utcfromtimestamp((bucket + 1) * interval)
+            )
+        except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+            pass
+
+
+    @staticmethod
+    def _syncSeatsAvailable(conf_key):
+        """Copy the seat shards' total to Conference.seatsAvailable; used by
+        /tasks/sync_seats.
+        """
+        conf = conf_key.get()
+        if conf and conf.seatShards:
+            ConferenceApi._setSeatsAvailable(conf_key,
+                countSeats(conf_key, conf.seatShards))
+
+
+    @staticmethod
+    @ndb.transactional()
+    def _setSeatsAvailable(conf_key, seats):
+        """Set Conference.seatsAvailable, if it has changed."""
+        conf = conf_key.get()
+        if conf.seatsAvailable != seats:
+            conf.seatsAvailable = seats
+            conf.put()
+            ConferenceApi._cacheVersions(conf)
+
+
+    @endpoints.method(GROUP_REGISTRATION_REQUEST, BooleanMessage,
+            path='conference/{websafeConferenceKey}/group',
+            http_method='POST', name='registerGroupForConference')
+    def registerGroupForConference(self, request):
+        """Register a group of users (by user ID) for selected conference;
+        all of them or, if seats run out, none."""
+        return self._groupRegistration(request)
+
+
+    @endpoints.method(GROUP_REGISTRATION_REQUEST, BooleanMessage,
+            path='conference/{websafeConferenceKey}/group',
+            http_method='DELETE', name='unregisterGroupFromConference')
+    def unregisterGroupFromConference(self, request):
+        """Unregister a group of users booked by the caller from selected
+        conference; all of them or none."""
+        return self._groupRegistration(request, reg=False)
+
+
+    def _groupRegistration(self, request, reg=True):
+        """Register or unregister a group of users for selected conference."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        booker = getUserId(user)
+        attendees = sorted(set(request.attendees))
+        if not attendees:
+            raise endpoints.BadRequestException("'attendees' field required")
+        if len(attendees) > MAX_GROUP_SIZE:
+            raise endpoints.BadRequestException(
+                "At most %d attendees may be booked at once." % MAX_GROUP_SIZE)
+
+        # check if conf exists given websafeConfKey
+        wsck = request.websafeConferenceKey
+        conf = ndb.Key(urlsafe=wsck).get()
+        if not conf:
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s' % wsck)
+        if not conf.seatShards:
+            conf = self._shardSeats(conf.key)
+
+        # register: claim seats from as few shards as hold enough, picking
+        # again if others took them meanwhile
+        if reg:
+            retval = None
+            for attempt in range(GROUP_CLAIM_ATTEMPTS):
+                seats = seatsByShard(conf.key, conf.seatShards)
+                shard_keys = [key for key in seats if seats[key] > 0]
+                random.shuffle(shard_keys)
+                picked, total = [], 0
+                for key in shard_keys:
+                    if total >= len(attendees):
+                        break
+                    picked.append(key)
+                    total += seats[key]
+                if total < len(attendees):
+                    break
+                retval = self._groupSeatTransaction(wsck, booker, attendees, picked, reg)
+                if retval is not None:
+                    break
+            if retval is None:
+                raise ConflictException(
+                    "There are not enough seats available.")
+
+        # unregister: give the seats back to any shard
+        else:
+            shard_key = random.choice(seatShardKeys(conf.key, conf.seatShards))
+            retval = self._groupSeatTransaction(wsck, booker, attendees, [shard_key], reg)
+
+        self._scheduleSeatSync(conf.key)
         return BooleanMessage(data=retval)
 
 
-    @endpoints.method(message_types.VoidMessage, ConferenceForms,
+    @instrumentedTransactional(lambda self, wsck, *args: wsck, xg=True)
+    def _groupSeatTransaction(self, wsck, booker, attendees, shard_keys, reg):
+        """Move seats between seat shards & a group's Registrations, all or
+        none; return None if the shards have too few seats left."""
+        # only users who have signed in (so have a Profile) can be booked
+        p_keys = [ndb.Key(Profile, attendee) for attendee in attendees]
+        profs = ndb.get_multi(p_keys)
+        for attendee, prof in zip(attendees, profs):
+            if not prof:
+                raise endpoints.NotFoundException(
+                    'No profile found for %s' % attendee)
+        shards = [shard or SeatShard(key=key)
+            for key, shard in zip(shard_keys, ndb.get_multi(shard_keys))]
+        reg_keys = [registrationKey(p_key, wsck) for p_key in p_keys]
+
+        # registrations still listed in a Profile move out as it's written
+        writes = []
+        for prof in profs:
+            writes.extend(moveLegacyRegistrations(prof))
+        regs = dict((r.key, r) for r in writes)
+        regs.update((r.key, r) for r in ndb.get_multi(reg_keys) if r)
+
+        # register
+        if reg:
+            # check if users already registered otherwise add
+            for attendee, reg_key in zip(attendees, reg_keys):
+                if reg_key in regs:
+                    raise ConflictException(
+                        "%s has already registered for this conference" % attendee)
+
+            # check the booker's seats for this conference stay capped
+            booking_key = groupBookingKey(booker, wsck)
+            booking = booking_key.get() or GroupBooking(key=booking_key)
+            if booking.seats + len(attendees) > MAX_BOOKED_SEATS:
+                raise ConflictException(
+                    "You may book at most %d seats for this conference." % MAX_BOOKED_SEATS)
+
+            # check if seats avail
+            needed = len(attendees)
+            if sum(shard.seats for shard in shards) < needed:
+                return None
+
+            # register users, take away their seats
+            for shard in shards:
+                taken = min(shard.seats, needed)
+                shard.seats -= taken
+                needed -= taken
+            writes.extend(Registration(key=reg_key, conferenceKey=ndb.Key(urlsafe=wsck),
+                bookedBy=booker) for reg_key in reg_keys)
+            booking.seats += len(attendees)
+            writes.append(booking)
+
+        # unregister
+        else:
+            # check users are registered, by the caller (or themselves)
+            for attendee, reg_key in zip(attendees, reg_keys):
+                if reg_key not in regs:
+                    raise ConflictException(
+                        "%s is not registered for this conference" % attendee)
+                if booker not in (attendee, regs[reg_key].bookedBy):
+                    raise endpoints.ForbiddenException(
+                        "Only whoever booked %s can unregister them." % attendee)
+
+            # unregister users, add back their seats (& to whoever booked them)
+            writes = [r for r in writes if r.key not in reg_keys]
+            writes.extend(releaseGroupBookings(wsck, [regs[k] for k in reg_keys]))
+            ndb.delete_multi(reg_keys)
+            shards[0].seats += len(attendees)
+
+        # write things back to the datastore & return; Profile writes bump
+        # their versions (ETags), as their conferenceKeysToAttend changed
+        ndb.put_multi(profs + shards + writes)
+        self._cacheVersions(*profs)
+        return True
+
+
+    def _copyTicketToForm(self, ticket):
+        """Copy RegistrationTicket to RegistrationTicketForm."""
+        tf = RegistrationTicketForm(
+            ticket=ticket.key.urlsafe(),
+            websafeConferenceKey=ticket.websafeConferenceKey,
+            status=getattr(RegistrationStatus, ticket.status),
+            message=ticket.message,
+        )
+        tf.check_initialized()
+        return tf
+
+
+    @endpoints.method(CONF_GET_REQUEST, RegistrationTicketForm,
+            path='conference/{websafeConferenceKey}/queue',
+            http_method='POST', name='registerForConferenceAsync')
+    def registerForConferenceAsync(self, request):
+        """Queue registration for selected conference; returns a ticket to
+        poll with getRegistrationTicket."""
+        prof = self._getProfileFromUser() # get user Profile
+        wsck = request.websafeConferenceKey
+        conf = ndb.Key(urlsafe=wsck).get()
+        if not conf:
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s' % wsck)
+        # reject what's already known to fail; the worker checks again
+        if registrationKey(prof.key, wsck).get() or wsck in prof.conferenceKeysToAttend:
+            raise ConflictException(
+                "You have already registered for this conference")
+
+        ticket = RegistrationTicket(parent=prof.key, websafeConferenceKey=wsck)
+        ticket.put()
+        taskqueue.Queue(REGISTRATION_QUEUE).add(taskqueue.Task(
+            payload=ticket.key.urlsafe(), method='PULL', tag=wsck))
+        self._addIntervalTask('/tasks/process_registrations', conf.key,
+            REGISTRATION_BATCH_INTERVAL)
+        return self._copyTicketToForm(ticket)
+
+
+    @endpoints.method(TICKET_GET_REQUEST, RegistrationTicketForm,
+            path='registration/{ticket}',
+            http_method='GET', name='getRegistrationTicket')
+    def getRegistrationTicket(self, request):
+        """Return status of a queued registration (by ticket)."""
+        prof = self._getProfileFromUser() # get user Profile
+        try:
+            t_key = ndb.Key(urlsafe=request.ticket)
+        except Exception:
+            t_key = None
+        ticket = t_key.get() if t_key and t_key.kind() == 'RegistrationTicket' else None
+        if not ticket:
+            raise endpoints.NotFoundException(
+                'No registration found with ticket: %s' % request.ticket)
+        if ticket.key.parent() != prof.key:
+            raise endpoints.ForbiddenException(
+                'Only the registrant can see a registration.')
+        return self._copyTicketToForm(ticket)
+
+
+    def _processRegistrations(self, conf_key):
+        """Apply a batch of queued registrations for a conference; used by
+        /tasks/process_registrations."""
+        wsck = conf_key.urlsafe()
+        queue = taskqueue.Queue(REGISTRATION_QUEUE)
+        tasks = queue.lease_tasks_by_tag(REGISTRATION_LEASE_SECONDS,
+            MAX_BATCH_REGISTRATIONS, tag=wsck)
+        if not tasks:
+            return
+
+        try:
+            conf = conf_key.get()
+            shard_keys = []
+            if conf:
+                if not conf.seatShards:
+                    conf = self._shardSeats(conf_key)
+                shard_keys = claimOrder(conf_key, conf.seatShards)
+            registered = self._applyRegistrations(wsck, conf is not None, shard_keys,
+                [ndb.Key(urlsafe=task.payload) for task in tasks])
+        except Exception:
+            # hand the batch straight back, for this task's retry to lease
+            # again rather than wait out REGISTRATION_LEASE_SECONDS
+            for task in tasks:
+                queue.modify_task_lease(task, 0)
+            raise
+        # tickets are final once that commits; a retry finds them so
+        queue.delete_tasks(tasks)
+
+        if registered:
+            self._scheduleSeatSync(conf_key)
+        # a full batch: there may be more waiting
+        if len(tasks) == MAX_BATCH_REGISTRATIONS:
+            taskqueue.add(params={'websafeConferenceKey': wsck},
+                url='/tasks/process_registrations'
+            )
+
+
+    @instrumentedTransactional(lambda self, wsck, *args: wsck, xg=True)
+    def _applyRegistrations(self, wsck, found, shard_keys, ticket_keys):
+        """Register the users of pending tickets for a conference in one
+        transaction, claiming seats from shard_keys; return how many were
+        registered."""
+        tickets = [t for t in ndb.get_multi(ticket_keys) if t and t.status == 'PENDING']
+        if not tickets:
+            return 0
+        shards = [shard for shard in ndb.get_multi(shard_keys) if shard]
+        p_keys = list(set(t.key.parent() for t in tickets))
+        profs = dict((prof.key, prof) for prof in ndb.get_multi(p_keys) if prof)
+
+        # registrations still listed in a Profile move out as it's written
+        writes = []
+        changed = set()
+        registered = set()
+        for prof in profs.values():
+            moved = moveLegacyRegistrations(prof)
+            if moved:
+                writes.extend(moved)
+                changed.add(prof.key)
+                registered.update(r.key for r in moved)
+        reg_keys = [registrationKey(t.key.parent(), wsck) for t in tickets]
+        registered.update(reg.key for reg in ndb.get_multi(reg_keys) if reg)
+
+        count = 0
+        claimed = set()
+        for ticket, reg_key in zip(tickets, reg_keys):
+            shard = next((shard for shard in shards if shard.seats > 0), None)
+            ticket.status = 'FAILED'
+            if not found:
+                ticket.message = 'No conference found with key: %s' % wsck
+            elif reg_key in registered:
+                ticket.message = "You have already registered for this conference"
+            elif not shard:
+                ticket.message = "There are no seats available."
+            else:
+                # register user, take away one seat
+                writes.append(Registration(key=reg_key, conferenceKey=ndb.Key(urlsafe=wsck)))
+                registered.add(reg_key)
+                changed.add(reg_key.parent())
+                shard.seats -= 1
+                claimed.add(shard.key)
+                ticket.status = 'REGISTERED'
+                count += 1
+
+        # write things back to the datastore & return; Profile writes bump
+        # their versions (ETags), as their conferenceKeysToAttend changed
+        changed = [profs[p_key] for p_key in changed if p_key in profs]
+        ndb.put_multi(tickets + changed + writes +
+            [shard for shard in shards if shard.key in claimed])
+        if changed:
+            self._cacheVersions(*changed)
+        return count
+
+
+    @endpoints.method(CONF_LIST_REQUEST, ConferenceForms,
             path='conferences/attending',
             http_method='GET', name='getConferencesToAttend')
     def getConferencesToAttend(self, request):
         """Get list of conferences that user has registered for."""
-        prof = self._getProfileFromUser() # get user Profile
-        conf_keys = [ndb.Key(urlsafe=wsck) for wsck in prof.conferenceKeysToAttend]
-        conferences = ndb.get_multi(conf_keys)
+        return self._getConferencesToAttend(request)
 
-        # get organizers
-        organisers = [ndb.Key(Profile, conf.organizerUserId) for conf in conferences]
-        profiles = ndb.get_multi(organisers)
 
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+    @endpoints.method(CONF_LIST_REQUEST, ConferenceColumns,
+            path='conferences/attending/columns',
+            http_method='GET', name='getConferencesToAttendColumns')
+    def getConferencesToAttendColumns(self, request):
+        """Get conferences that user has registered for, in columnar form."""
+        return self._copyFormsToColumns(self._getConferencesToAttend(request),
+            self._formatFieldMask(request.fields))
+
+
+    @endpoints.method(CONF_GET_REQUEST, AttendeeForms,
+            path='conference/{websafeConferenceKey}/attendees',
+            http_method='GET', name='getConferenceAttendees')
+    def getConferenceAttendees(self, request):
+        """Return users registered for a conference; organiser only."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        conf = ndb.Key(urlsafe=request.websafeConferenceKey).get()
+        if not conf:
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s' % request.websafeConferenceKey)
+        if getUserId(user) != conf.organizerUserId:
+            raise endpoints.ForbiddenException(
+                'Only the owner can see the attendees.')
+
+        # registrations still listed in a Profile (not yet moved out by
+        # /tasks/migrate_registrations) aren't in the query
+        profiles = ndb.get_multi(attendeeKeys(conf.key))
+        return AttendeeForms(items=[AttendeeForm(displayName=prof.displayName,
+            mainEmail=prof.mainEmail) for prof in profiles if prof])
+
+
+    def _getConferencesToAttend(self, request):
+        """Return ConferenceForms for conferences user has registered for."""
+        prof = self._getProfileFromUser() # get user Profile
+        fields = self._formatFieldMask(request.fields)
+        conf_keys = [ndb.Key(urlsafe=wsck) for wsck in conferencesAttending(prof)]
+        conferences = [conf for conf in ndb.get_multi(conf_keys) if conf]
 
         # return set of ConferenceForm objects per Conference
-        return ConferenceForms(items=[self._copyConferenceToForm(conf, names[conf.organizerUserId])\
-         for conf in conferences]
+        return ConferenceForms(
+            items=self._copyConferencesToFormsAsync(conferences, fields).get_result()
         )
 
 
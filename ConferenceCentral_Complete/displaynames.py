@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""displaynames.py
+
+Udacity conference server-side Python App Engine organiser displayName
+resolver; a bounded per-instance LRU in front of memcache in front of
+the Profile entities.
+
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from models import Profile
+
+# most display names kept per instance
+LRU_SIZE = 1000
+# seconds an instance trusts its own copy; other instances only see a
+# displayName change through memcache
+LRU_TTL = 60
+MEMCACHE_DISPLAY_NAME_PREFIX = "DISPLAY_NAME:"
+MEMCACHE_DISPLAY_NAME_TTL = 3600
+
+
+class DisplayNameResolver(object):
+    """Map organiser user IDs to Profile displayNames."""
+
+    def __init__(self, size=LRU_SIZE, ttl=LRU_TTL):
+        self._size = size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._names = OrderedDict()     # user ID -> (displayName, expiry)
+
+    def _lruGet(self, user_id, now):
+        with self._lock:
+            entry = self._names.pop(user_id, None)
+            if entry and entry[1] > now:
+                # re-insert as most recently used
+                self._names[user_id] = entry
+                return entry[0]
+        return None
+
+    def _lruSet(self, user_id, name, now):
+        with self._lock:
+            self._names.pop(user_id, None)
+            self._names[user_id] = (name, now + self._ttl)
+            while len(self._names) > self._size:
+                self._names.popitem(last=False)
+
+    @ndb.tasklet
+    def resolveAsync(self, user_ids):
+        """Return {user ID: displayName} for organiser user IDs."""
+        now = time.time()
+        names = {}
+        missing = []
+        for user_id in set(user_ids):
+            name = self._lruGet(user_id, now)
+            if name is None:
+                missing.append(user_id)
+            else:
+                names[user_id] = name
+
+        if missing:
+            cached = memcache.get_multi(missing, key_prefix=MEMCACHE_DISPLAY_NAME_PREFIX)
+            missing = [user_id for user_id in missing if user_id not in cached]
+            if missing:
+                profiles = yield ndb.get_multi_async(
+                    [ndb.Key(Profile, user_id) for user_id in missing])
+                fetched = dict((prof.key.id(), prof.displayName)
+                               for prof in profiles if prof and prof.displayName)
+                memcache.add_multi(fetched, key_prefix=MEMCACHE_DISPLAY_NAME_PREFIX,
+                                   time=MEMCACHE_DISPLAY_NAME_TTL)
+                cached.update(fetched)
+            for user_id, name in cached.items():
+                self._lruSet(user_id, name, now)
+            names.update(cached)
+
+        raise ndb.Return(names)
+
+    def resolve(self, user_ids):
+        """Return {user ID: displayName} for organiser user IDs."""
+        return self.resolveAsync(user_ids).get_result()
+
+    def update(self, user_id, name):
+        """Record a changed displayName for user_id."""
+        memcache.set(MEMCACHE_DISPLAY_NAME_PREFIX + user_id, name,
+                     time=MEMCACHE_DISPLAY_NAME_TTL)
+        self._lruSet(user_id, name, time.time())
+
+
+# one resolver per instance
+DISPLAY_NAMES = DisplayNameResolver()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+"""facets.py
+
+Udacity conference server-side Python App Engine facet counts (number of
+conferences per city, topic & month), kept in sharded counter entities
+by the Conference write paths & cached in memcache.
+
+"""
+
+import random
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from models import Conference
+from models import FacetCounterShard
+
+# Conference properties conferences are counted by
+FACET_FIELDS = ('city', 'topics', 'month')
+# counter shards per facet value; writes pick one at random
+FACET_SHARDS = 10
+MEMCACHE_FACET_KEY_TPL = "FACET_COUNT:%s:%s"
+# cached totals expire in case an incr/decr was lost
+MEMCACHE_FACET_TTL = 3600
+
+
+def facetValues(conf):
+    """Return set of (field, value) facets a Conference is counted under."""
+    values = set()
+    if conf:
+        for field in FACET_FIELDS:
+            value = getattr(conf, field)
+            for v in (value if isinstance(value, list) else [value]):
+                if v not in (None, ''):
+                    values.add((field, v))
+    return values
+
+
+def _shardKeys(field, value):
+    """Return keys of every counter shard for one facet value."""
+    return [ndb.Key(FacetCounterShard, u'%s|%s|%d' % (field, value, shard))
+            for shard in range(FACET_SHARDS)]
+
+
+@ndb.transactional_tasklet
+def _incrementAsync(field, value, delta):
+    """Add delta to a random counter shard of one facet value."""
+    shard_key = random.choice(_shardKeys(field, value))
+    shard = yield shard_key.get_async()
+    if not shard:
+        shard = FacetCounterShard(key=shard_key)
+    shard.count += delta
+    yield shard.put_async()
+
+
+def facetDeltas(old, new):
+    """Return {(field, value): delta} moving counts from facets in old to
+    facets in new (sets of (field, value), see facetValues)."""
+    return dict([(facet, -1) for facet in old - new] + [(facet, 1) for facet in new - old])
+
+
+def updateFacetCounts(old, new):
+    """Move counts from facets in old to facets in new; pass an empty old
+    set for new conferences."""
+    addFacetCounts(facetDeltas(old, new))
+
+
+def addFacetCounts(deltas):
+    """Add {(field, value): delta} to facet counts, one shard write per
+    facet however many conferences the delta covers."""
+    deltas = [(facet, delta) for facet, delta in deltas.items() if delta]
+    futures = [_incrementAsync(field, value, delta) for (field, value), delta in deltas]
+    ndb.Future.wait_all(futures)
+    for future in futures:
+        future.check_success()
+
+    # keep cached totals in step; missing ones are rebuilt on read
+    for (field, value), delta in deltas:
+        if delta > 0:
+            memcache.incr(MEMCACHE_FACET_KEY_TPL % (field, value), delta)
+        else:
+            memcache.decr(MEMCACHE_FACET_KEY_TPL % (field, value), -delta)
+
+
+@ndb.transactional(xg=True)
+def _setCount(field, value, count):
+    """Replace one facet value's counter shards with a total of count."""
+    ndb.put_multi([FacetCounterShard(key=key, count=count if i == 0 else 0)
+                   for i, key in enumerate(_shardKeys(field, value))])
+
+
+def recountFacet(field, value):
+    """Reset one facet value's count to the number of Conferences counted
+    under it, e.g. for conferences written before facets were counted;
+    counts changed between the query & the reset are lost."""
+    count = Conference.query(getattr(Conference, field) == value).count()
+    _setCount(field, value, count)
+    memcache.set(MEMCACHE_FACET_KEY_TPL % (field, value), count,
+                 time=MEMCACHE_FACET_TTL)
+
+
+def getFacetCounts(facets):
+    """Return {(field, value): count} for a list of (field, value) facets."""
+    cache_keys = dict((MEMCACHE_FACET_KEY_TPL % facet, facet) for facet in facets)
+    cached = memcache.get_multi(cache_keys.keys())
+    counts = dict((cache_keys[key], count) for key, count in cached.items())
+
+    # sum the shards of everything memcache didn't have in one get_multi
+    missing = [facet for facet in facets if facet not in counts]
+    shard_keys = [_shardKeys(field, value) for field, value in missing]
+    shards = ndb.get_multi([key for keys in shard_keys for key in keys])
+    for i, facet in enumerate(missing):
+        facet_shards = shards[i * FACET_SHARDS:(i + 1) * FACET_SHARDS]
+        counts[facet] = max(0, sum(shard.count for shard in facet_shards if shard))
+        memcache.add(MEMCACHE_FACET_KEY_TPL % facet, counts[facet],
+                     time=MEMCACHE_FACET_TTL)
+    return counts
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+"""filterindex.py
+
+Udacity conference server-side Python App Engine in-instance secondary
+index over Conference filter fields; answers conjunctions of filters with
+inequalities on more than one field, which datastore queries can't.
+
+"""
+
+import binascii
+import operator
+import threading
+import time
+from bisect import bisect_left
+from bisect import bisect_right
+from datetime import datetime
+from datetime import timedelta
+
+from models import Conference
+
+# Conference properties the index can filter on
+INDEXED_FIELDS = ('city', 'topics', 'month', 'maxAttendees',
+                  'startDate', 'endDate', 'weeks')
+# seconds between incremental refreshes from the datastore
+REFRESH_INTERVAL = 30
+# overlap re-read on each refresh, to cover clock skew between instances
+REFRESH_SKEW = timedelta(seconds=5)
+FETCH_BATCH_SIZE = 500
+
+COMPARATORS = {
+    '=':  operator.eq,
+    '>':  operator.gt,
+    '>=': operator.ge,
+    '<':  operator.lt,
+    '<=': operator.le,
+    '!=': operator.ne,
+    'IN': lambda value, values: value in values,
+}
+
+
+def matchesFilter(conf, filtr):
+    """Return True if Conference satisfies one formatted filter; like the
+    datastore, a repeated property matches if any of its values does. An
+    unset (None) value matches nothing."""
+    values = _values(conf, filtr["field"])
+    compare = COMPARATORS[filtr["operator"]]
+    return any(compare(v, filtr["value"]) for v in values)
+
+
+def _values(conf, field):
+    """Return a Conference field's values as a list, leaving out None
+    (e.g. no endDate); None can't be compared with dates."""
+    value = getattr(conf, field)
+    return [v for v in (value if isinstance(value, list) else [value])
+            if v is not None]
+
+
+def _toBits(positions, size):
+    """Return bitset (long) with the given row positions set."""
+    buf = bytearray((size + 7) // 8)
+    for pos in positions:
+        buf[pos >> 3] |= 1 << (pos & 7)
+    if not buf:
+        return 0
+    buf.reverse()
+    return int(binascii.hexlify(buf), 16)
+
+
+def _fromBits(bits):
+    """Return row positions set in bitset."""
+    digits = bin(bits)[:1:-1]
+    return [pos for pos, digit in enumerate(digits) if digit == '1']
+
+
+class _SortedColumn(object):
+    """Sorted (value, row position) pairs for one indexed field."""
+
+    def __init__(self):
+        self.values = []
+        self.positions = []
+
+    def add(self, value, pos):
+        i = bisect_right(self.values, value)
+        self.values.insert(i, value)
+        self.positions.insert(i, pos)
+
+    def remove(self, value, pos):
+        lo = bisect_left(self.values, value)
+        hi = bisect_right(self.values, value)
+        i = self.positions.index(pos, lo, hi)
+        del self.values[i]
+        del self.positions[i]
+
+    def lookup(self, operator, value):
+        """Return row positions matching 'field <operator> value'."""
+        lo = bisect_left(self.values, value)
+        hi = bisect_right(self.values, value)
+        if operator == '=':
+            return self.positions[lo:hi]
+        if operator == '>':
+            return self.positions[hi:]
+        if operator == '>=':
+            return self.positions[lo:]
+        if operator == '<':
+            return self.positions[:lo]
+        if operator == '<=':
+            return self.positions[:hi]
+        if operator == '!=':
+            return self.positions[:lo] + self.positions[hi:]
+        raise ValueError('Unknown operator: %s' % operator)
+
+
+class ConferenceFilterIndex(object):
+    """Per-instance index of Conference filter fields.
+
+    Each Conference gets a row position; every indexed field keeps a
+    sorted column of (value, position) pairs and equality lookups are
+    kept as bitsets, so a conjunction of filters is a bitwise AND.
+    """
+
+    def __init__(self):
+        # guards the index state; held by load() throughout, and by
+        # refresh() & search() only while reading or changing rows
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._keys = []         # position -> Conference key
+        self._names = []        # position -> Conference name
+        self._rows = {}         # Conference key -> (position, field values)
+        self._columns = dict((f, _SortedColumn()) for f in INDEXED_FIELDS)
+        self._equals = dict((f, {}) for f in INDEXED_FIELDS)
+        self._since = None
+        self._refreshed = None
+
+    def isWarm(self):
+        """Return True once the index has been loaded."""
+        return self._refreshed is not None
+
+    def load(self):
+        """(Re)build the index from every Conference in the datastore."""
+        with self._lock:
+            self._load()
+
+    def ensureLoaded(self):
+        """Load the index on first use; return True if it is warm, or False
+        if another request is loading it meanwhile."""
+        if self.isWarm():
+            return True
+        if not self._lock.acquire(False):
+            return False
+        try:
+            if not self.isWarm():
+                self._load()
+        finally:
+            self._lock.release()
+        return True
+
+    def _load(self):
+        self._reset()
+        started = datetime.utcnow()
+        for conf in Conference.query().iter(batch_size=FETCH_BATCH_SIZE):
+            self._put(conf)
+        self._since = started
+        self._refreshed = time.time()
+
+    def refresh(self, force=False):
+        """Apply Conferences modified since the last (re)load or refresh."""
+        if not self.isWarm():
+            return
+        if not force and time.time() - self._refreshed < REFRESH_INTERVAL:
+            return
+        # another request is already refreshing; serve what we have
+        if not self._refreshing.acquire(False):
+            return
+        try:
+            # read outside the index lock, so searches go on meanwhile
+            started = datetime.utcnow()
+            since = self._since - REFRESH_SKEW
+            confs = list(Conference.query(Conference.modified >= since).iter(
+                batch_size=FETCH_BATCH_SIZE))
+            with self._lock:
+                for conf in confs:
+                    self._put(conf)
+                self._since = started
+                self._refreshed = time.time()
+        finally:
+            self._refreshing.release()
+
+    def _put(self, conf):
+        """Add or replace the row for a Conference."""
+        # unset values aren't indexed, so no filter on them matches
+        values = dict((field, _values(conf, field)) for field in INDEXED_FIELDS)
+
+        row = self._rows.get(conf.key)
+        if row:
+            pos, old_values = row
+            for field in INDEXED_FIELDS:
+                for value in old_values[field]:
+                    self._columns[field].remove(value, pos)
+                    self._equals[field][value] &= ~(1 << pos)
+            self._names[pos] = conf.name
+        else:
+            pos = len(self._keys)
+            self._keys.append(conf.key)
+            self._names.append(conf.name)
+
+        for field in INDEXED_FIELDS:
+            for value in values[field]:
+                self._columns[field].add(value, pos)
+                self._equals[field][value] = self._equals[field].get(value, 0) | (1 << pos)
+        self._rows[conf.key] = (pos, values)
+
+    def search(self, filters):
+        """Return Conference keys matching all formatted filters, by name."""
+        with self._lock:
+            return self._search(filters)
+
+    def _search(self, filters):
+        size = len(self._keys)
+        bits = (1 << size) - 1
+        for filtr in filters:
+            field, operator, value = filtr["field"], filtr["operator"], filtr["value"]
+            if operator == '=':
+                bits &= self._equals[field].get(value, 0)
+            elif operator == 'IN':
+                bits &= reduce(lambda any_bits, v: any_bits | self._equals[field].get(v, 0),
+                    value, 0)
+            else:
+                bits &= _toBits(self._columns[field].lookup(operator, value), size)
+            if not bits:
+                return []
+        positions = _fromBits(bits)
+        positions.sort(key=lambda pos: (self._names[pos], self._keys[pos]))
+        return [self._keys[pos] for pos in positions]
+
+
+# one index per instance
+CONFERENCE_INDEX = ConferenceFilterIndex()
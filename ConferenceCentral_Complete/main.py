@@ -12,10 +12,36 @@ created by wesc on 2014 may 24
 
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
+import json
+import os
+import time
+
 import webapp2
+from protorpc import protobuf
+from protorpc import protojson
+from protorpc import remote
+from protorpc.wsgi import service
 from google.appengine.api import app_identity
+from google.appengine.api import datastore_errors
 from google.appengine.api import mail
+from google.appengine.api import taskqueue
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
 from conference import ConferenceApi
+from models import Conference
+from models import ConferenceForms
+from facets import addFacetCounts
+from filterindex import CONFERENCE_INDEX
+from textsearch import indexConference
+from txstats import TRANSACTION_STATS
+
+# Conferences per /export/conferences page
+EXPORT_BATCH_SIZE = 500
+
+# ConferenceApi over the protocol buffer wire format only; the JSON API
+# stays on Cloud Endpoints
+PROTOBUF_PROTOCOLS = remote.Protocols()
+PROTOBUF_PROTOCOLS.add_protocol(protobuf, 'protobuf')
 
 class SetAnnouncementHandler(webapp2.RequestHandler):
     def get(self):
@@ -38,7 +64,165 @@ class SendConfirmationEmailHandler(webapp2.RequestHandler):
         )
 
 
+class IndexConferenceHandler(webapp2.RequestHandler):
+    def post(self):
+        """Update full-text search index for a Conference."""
+        indexConference(ndb.Key(urlsafe=self.request.get('websafeConferenceKey')))
+
+
+class UpdateFacetCountsHandler(webapp2.RequestHandler):
+    def post(self):
+        """Move facet counts after a Conference update."""
+        addFacetCounts(dict(((field, value), delta)
+            for field, value, delta in json.loads(self.request.get('deltas'))))
+
+
+class UpdateOrganizerNameHandler(webapp2.RequestHandler):
+    def post(self):
+        """Copy organiser's displayName onto their Conferences."""
+        ConferenceApi._updateOrganizerDisplayName(self.request.get('userId'))
+
+
+class ExportConferencesHandler(webapp2.RequestHandler):
+    def get(self):
+        """Write one page of Conferences as JSON ConferenceForms; pass its
+        nextPageToken back as ?pageToken= for the next, so no request runs
+        into the deadline however many conferences there are."""
+        page_token = self.request.get('pageToken')
+        try:
+            cursor = Cursor(urlsafe=page_token) if page_token else None
+        except datastore_errors.BadValueError:
+            self.abort(400, 'Invalid pageToken.')
+        # keep fetched entities out of the in-context cache
+        confs, cursor, more = Conference.query().fetch_page(EXPORT_BATCH_SIZE,
+            start_cursor=cursor, use_cache=False, use_memcache=False)
+        forms = ConferenceForms(
+            items=ConferenceApi()._copyConferencesToFormsAsync(confs).get_result(),
+            nextPageToken=cursor.urlsafe() if more and cursor else None)
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(protojson.encode_message(forms))
+
+
+class SyncSeatsHandler(webapp2.RequestHandler):
+    def post(self):
+        """Copy a Conference's seat shard total to seatsAvailable."""
+        ConferenceApi._syncSeatsAvailable(
+            ndb.Key(urlsafe=self.request.get('websafeConferenceKey')))
+
+
+class ResizeSeatsHandler(webapp2.RequestHandler):
+    def post(self):
+        """Add or withdraw seats after a Conference's maxAttendees changed."""
+        ConferenceApi()._resizeSeats(
+            ndb.Key(urlsafe=self.request.get('websafeConferenceKey')),
+            int(self.request.get('shards')), int(self.request.get('delta')))
+
+
+class MigrateRegistrationsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Start moving Profile registration lists into Registrations."""
+        taskqueue.add(url='/tasks/migrate_registrations')
+        self.response.set_status(202)
+
+    def post(self):
+        """Move one page of Profiles' registrations, queueing the next."""
+        cursor = self.request.get('cursor')
+        ConferenceApi._migrateRegistrations(Cursor(urlsafe=cursor) if cursor else None)
+
+
+class ReindexConferencesHandler(webapp2.RequestHandler):
+    def get(self):
+        """Start rebuilding the full-text search index of every Conference."""
+        taskqueue.add(url='/tasks/reindex_conferences')
+        self.response.set_status(202)
+
+    def post(self):
+        """Queue index updates for one page of Conferences, then the next."""
+        cursor = self.request.get('cursor')
+        ConferenceApi._reindexConferences(Cursor(urlsafe=cursor) if cursor else None)
+
+
+class BackfillWeeksHandler(webapp2.RequestHandler):
+    def get(self):
+        """Start storing week buckets on Conferences written before them."""
+        taskqueue.add(url='/tasks/backfill_weeks')
+        self.response.set_status(202)
+
+    def post(self):
+        """Rewrite one page of Conferences, queueing the next."""
+        cursor = self.request.get('cursor')
+        ConferenceApi._backfillWeeks(Cursor(urlsafe=cursor) if cursor else None)
+
+
+class BackfillFacetsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Start recounting every facet value Conferences are counted under."""
+        taskqueue.add(params={'run': int(time.time())},
+            url='/tasks/backfill_facets')
+        self.response.set_status(202)
+
+    def post(self):
+        """Queue recounts for one page of Conferences, queueing the next."""
+        cursor = self.request.get('cursor')
+        ConferenceApi._backfillFacets(self.request.get('run'),
+            Cursor(urlsafe=cursor) if cursor else None)
+
+
+class RecountFacetHandler(webapp2.RequestHandler):
+    def post(self):
+        """Reset one facet value's count from the Conferences it covers."""
+        ConferenceApi._recountFacet(self.request.get('field'),
+            self.request.get('value'))
+
+
+class ProcessRegistrationsHandler(webapp2.RequestHandler):
+    def post(self):
+        """Apply a batch of queued registrations for a Conference."""
+        ConferenceApi()._processRegistrations(
+            ndb.Key(urlsafe=self.request.get('websafeConferenceKey')))
+
+
+class StatsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Return this instance's transaction counters per Conference,
+        most collisions first, as JSON."""
+        stats = TRANSACTION_STATS.snapshot()
+        keys = sorted(stats, key=lambda key: (-stats[key]['collisions'], key))
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps({
+            'instance': os.environ.get('INSTANCE_ID'),
+            'transactions': [dict(stats[key], websafeConferenceKey=key) for key in keys],
+        }))
+
+
+class WarmupHandler(webapp2.RequestHandler):
+    def get(self):
+        """Load this instance's Conference filter index."""
+        CONFERENCE_INDEX.load()
+        self.response.set_status(204)
+
+
 app = webapp2.WSGIApplication([
     ('/crons/set_announcement', SetAnnouncementHandler),
     ('/tasks/send_confirmation_email', SendConfirmationEmailHandler),
+    ('/tasks/index_conference', IndexConferenceHandler),
+    ('/tasks/update_organizer_name', UpdateOrganizerNameHandler),
+    ('/tasks/update_facet_counts', UpdateFacetCountsHandler),
+    ('/tasks/sync_seats', SyncSeatsHandler),
+    ('/tasks/resize_seats', ResizeSeatsHandler),
+    ('/tasks/migrate_registrations', MigrateRegistrationsHandler),
+    ('/tasks/reindex_conferences', ReindexConferencesHandler),
+    ('/tasks/backfill_weeks', BackfillWeeksHandler),
+    ('/tasks/backfill_facets', BackfillFacetsHandler),
+    ('/tasks/recount_facet', RecountFacetHandler),
+    ('/tasks/process_registrations', ProcessRegistrationsHandler),
+    ('/export/conferences', ExportConferencesHandler),
+    ('/_stats', StatsHandler),
+    ('/_ah/warmup', WarmupHandler),
 ], debug=True)
+
+# POST /protobuf/conference.<methodName> with an application/x-google-protobuf
+# (or application/octet-stream) body of the method's request message;
+# path & query parameters of the JSON API are fields of that message
+protobuf_app = service.service_mapping(ConferenceApi, r'/protobuf/conference',
+    protocols=PROTOBUF_PROTOCOLS)
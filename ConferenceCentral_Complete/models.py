@@ -17,6 +17,18 @@ import endpoints
 from protorpc import messages
 from google.appengine.ext import ndb
 
+# most week buckets recorded for one Conference
+MAX_CONFERENCE_WEEKS = 104
+
+def weekBuckets(startDate, endDate):
+    """Return week numbers (proleptic Gregorian ordinal // 7) from
+    startDate through endDate; used to bucket Conference date ranges"""
+    if not startDate:
+        return []
+    first = startDate.toordinal() // 7
+    last = (endDate or startDate).toordinal() // 7
+    return range(first, min(max(first, last), first + MAX_CONFERENCE_WEEKS - 1) + 1)
+
 class ConflictException(endpoints.ServiceException):
     """ConflictException -- exception mapped to HTTP 409 response"""
     http_status = httplib.CONFLICT
@@ -26,7 +38,34 @@ class Profile(ndb.Model):
     displayName = ndb.StringProperty()
     mainEmail = ndb.StringProperty()
     teeShirtSize = ndb.StringProperty(default='NOT_SPECIFIED')
+    # superseded by Registration; emptied by /tasks/migrate_registrations
     conferenceKeysToAttend = ndb.StringProperty(repeated=True)
+    version = ndb.IntegerProperty(default=0, indexed=False)
+
+    def _pre_put_hook(self):
+        # bump version stamp (ETag) on every write
+        self.version = (self.version or 0) + 1
+
+class Registration(ndb.Model):
+    """Registration -- user's registration for a conference; child of the
+    user's Profile, keyed by websafe Conference key"""
+    conferenceKey = ndb.KeyProperty(kind='Conference')
+    registered = ndb.DateTimeProperty(auto_now_add=True)
+    # user ID of whoever made a group booking for the user, if anyone
+    bookedBy = ndb.StringProperty(indexed=False)
+
+class GroupBooking(ndb.Model):
+    """GroupBooking -- seats one user holds through group bookings for a
+    conference, keyed 'booker user ID|websafe Conference key'"""
+    seats = ndb.IntegerProperty(default=0, indexed=False)
+
+class RegistrationTicket(ndb.Model):
+    """RegistrationTicket -- queued conference registration; child of the
+    registrant's Profile"""
+    websafeConferenceKey = ndb.StringProperty(indexed=False)
+    status = ndb.StringProperty(default='PENDING', indexed=False)
+    message = ndb.StringProperty(indexed=False)
+    created = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
 
 class ProfileMiniForm(messages.Message):
     """ProfileMiniForm -- update Profile form message"""
@@ -39,6 +78,17 @@ class ProfileForm(messages.Message):
     mainEmail = messages.StringField(2)
     teeShirtSize = messages.EnumField('TeeShirtSize', 3)
     conferenceKeysToAttend = messages.StringField(4, repeated=True)
+    etag = messages.StringField(5)
+    notModified = messages.BooleanField(6)
+
+class AttendeeForm(messages.Message):
+    """AttendeeForm -- conference attendee outbound form message"""
+    displayName = messages.StringField(1)
+    mainEmail = messages.StringField(2)
+
+class AttendeeForms(messages.Message):
+    """AttendeeForms -- multiple AttendeeForm outbound form message"""
+    items = messages.MessageField(AttendeeForm, 1, repeated=True)
 
 class StringMessage(messages.Message):
     """StringMessage-- outbound (single) string message"""
@@ -53,6 +103,9 @@ class Conference(ndb.Model):
     name            = ndb.StringProperty(required=True)
     description     = ndb.StringProperty()
     organizerUserId = ndb.StringProperty()
+    # copy of the organiser's Profile.displayName; kept current by
+    # /tasks/update_organizer_name
+    organizerDisplayName = ndb.StringProperty(indexed=False)
     topics          = ndb.StringProperty(repeated=True)
     city            = ndb.StringProperty()
     startDate       = ndb.DateProperty()
@@ -60,6 +113,43 @@ class Conference(ndb.Model):
     endDate         = ndb.DateProperty()
     maxAttendees    = ndb.IntegerProperty()
     seatsAvailable  = ndb.IntegerProperty()
+    # number of SeatShards seat inventory is kept in; 0 until the first
+    # registration, and seatsAvailable is then a periodically synced total
+    seatShards      = ndb.IntegerProperty(default=0, indexed=False)
+    modified        = ndb.DateTimeProperty(auto_now=True)
+    weeks           = ndb.ComputedProperty(
+        lambda self: weekBuckets(self.startDate, self.endDate), repeated=True)
+    version         = ndb.IntegerProperty(default=0, indexed=False)
+
+    def _pre_put_hook(self):
+        # bump version stamp (ETag) on every write
+        self.version = (self.version or 0) + 1
+
+class SearchPosting(ndb.Model):
+    """SearchPosting -- one chunk of a search term's posting list"""
+    term            = ndb.StringProperty()
+    conferenceKeys  = ndb.KeyProperty(kind=Conference, repeated=True, indexed=False)
+    weights         = ndb.IntegerProperty(repeated=True, indexed=False)
+
+class SearchPostingLane(ndb.Model):
+    """SearchPostingLane -- number of chunks in one lane of a search term's
+    posting list; new postings go to the last"""
+    chunks          = ndb.IntegerProperty(default=1, indexed=False)
+
+class SearchDocument(ndb.Model):
+    """SearchDocument -- terms a Conference is indexed under, by websafe key"""
+    terms           = ndb.StringProperty(repeated=True, indexed=False)
+    weights         = ndb.IntegerProperty(repeated=True, indexed=False)
+    # SearchPosting chunk holding each term's posting
+    postingKeys     = ndb.KeyProperty(kind=SearchPosting, repeated=True, indexed=False)
+
+class FacetCounterShard(ndb.Model):
+    """FacetCounterShard -- one shard of a facet value's conference count"""
+    count           = ndb.IntegerProperty(default=0, indexed=False)
+
+class SeatShard(ndb.Model):
+    """SeatShard -- one shard of a conference's available seats"""
+    seats           = ndb.IntegerProperty(default=0, indexed=False)
 
 class ConferenceForm(messages.Message):
     """ConferenceForm -- Conference outbound form message"""
@@ -75,10 +165,68 @@ class ConferenceForm(messages.Message):
     endDate         = messages.StringField(10) #DateTimeField()
     websafeKey      = messages.StringField(11)
     organizerDisplayName = messages.StringField(12)
+    etag            = messages.StringField(13)
+    notModified     = messages.BooleanField(14)
 
 class ConferenceForms(messages.Message):
     """ConferenceForms -- multiple Conference outbound form message"""
     items = messages.MessageField(ConferenceForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
+
+class ConferenceColumns(messages.Message):
+    """ConferenceColumns -- multiple Conference outbound columnar message;
+    one parallel list per ConferenceForm field (empty if masked out),
+    with '' / 0 for unset values and repeated strings dictionary-encoded"""
+    websafeKeys         = messages.StringField(1, repeated=True)
+    names               = messages.StringField(2, repeated=True)
+    descriptions        = messages.StringField(3, repeated=True)
+    organizerUserIds    = messages.StringField(4, repeated=True)
+    topicDictionary     = messages.StringField(5, repeated=True)
+    topicCounts         = messages.IntegerField(6, repeated=True, variant=messages.Variant.INT32)
+    topics              = messages.IntegerField(7, repeated=True, variant=messages.Variant.INT32)
+    cityDictionary      = messages.StringField(8, repeated=True)
+    cities              = messages.IntegerField(9, repeated=True, variant=messages.Variant.INT32)
+    startDates          = messages.StringField(10, repeated=True)
+    months              = messages.IntegerField(11, repeated=True, variant=messages.Variant.INT32)
+    maxAttendees        = messages.IntegerField(12, repeated=True, variant=messages.Variant.INT32)
+    seatsAvailable      = messages.IntegerField(13, repeated=True, variant=messages.Variant.INT32)
+    endDates            = messages.StringField(14, repeated=True)
+    organizerDictionary = messages.StringField(15, repeated=True)
+    organizerDisplayNames = messages.IntegerField(16, repeated=True, variant=messages.Variant.INT32)
+    nextPageToken       = messages.StringField(17)
+
+class ConferenceLookupForm(messages.Message):
+    """ConferenceLookupForm -- Conference (if found) for one requested key"""
+    websafeConferenceKey = messages.StringField(1)
+    found = messages.BooleanField(2)
+    conference = messages.MessageField(ConferenceForm, 3)
+
+class ConferenceLookupForms(messages.Message):
+    """ConferenceLookupForms -- multiple ConferenceLookupForm outbound form message"""
+    items = messages.MessageField(ConferenceLookupForm, 1, repeated=True)
+
+class FacetCountForm(messages.Message):
+    """FacetCountForm -- number of conferences with field = value"""
+    field = messages.StringField(1)
+    value = messages.StringField(2)
+    count = messages.IntegerField(3)
+
+class FacetCountForms(messages.Message):
+    """FacetCountForms -- multiple FacetCountForm inbound/outbound form message"""
+    items = messages.MessageField(FacetCountForm, 1, repeated=True)
+
+class RegistrationTicketForm(messages.Message):
+    """RegistrationTicketForm -- queued registration outbound form message"""
+    ticket = messages.StringField(1)
+    websafeConferenceKey = messages.StringField(2)
+    status = messages.EnumField('RegistrationStatus', 3)
+    message = messages.StringField(4)
+
+class RegistrationStatus(messages.Enum):
+    """RegistrationStatus -- queued registration status enumeration value"""
+    PENDING = 1
+    REGISTERED = 2
+    FAILED = 3
 
 class TeeShirtSize(messages.Enum):
     """TeeShirtSize -- t-shirt size enumeration value"""
@@ -103,8 +251,12 @@ class ConferenceQueryForm(messages.Message):
     field = messages.StringField(1)
     operator = messages.StringField(2)
     value = messages.StringField(3)
+    values = messages.StringField(4, repeated=True)
 
 class ConferenceQueryForms(messages.Message):
     """ConferenceQueryForms -- multiple ConferenceQueryForm inbound form message"""
     filters = messages.MessageField(ConferenceQueryForm, 1, repeated=True)
+    pageSize = messages.IntegerField(2, variant=messages.Variant.INT32)
+    pageToken = messages.StringField(3)
+    fields = messages.StringField(4, repeated=True)
 
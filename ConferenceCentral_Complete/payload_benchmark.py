@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""payload_benchmark.py
+
+Udacity conference server-side Python App Engine response payload
+benchmark; bytes (plain & gzipped) and encode/decode time of a page of
+conferences as ConferenceForms & ConferenceColumns, over JSON (the Cloud
+Endpoints API) and protocol buffers (/protobuf/conference).
+
+usage: python payload_benchmark.py SDK_PATH [ITEMS]
+
+SDK_PATH is the App Engine Python SDK (the directory holding
+dev_appserver.py); no datastore is needed, the forms are made up.
+
+"""
+
+import gzip
+import random
+import string
+import sys
+import time
+from cStringIO import StringIO
+from datetime import date
+from datetime import timedelta
+
+# conferences per page measured
+ITEMS = 1000
+# timings are the best of REPEAT runs
+REPEAT = 5
+
+CITIES = ('London', 'Paris', 'Chicago', 'Tokyo', 'San Francisco',
+          'Berlin', 'Sydney', 'Toronto', 'Kiev', 'Mumbai')
+TOPICS = ('Medical Innovations', 'Programming Languages', 'Web Technologies',
+          'Movie Making', 'Health and Nutrition', 'Cloud Computing')
+
+
+def _fixSysPath(sdk):
+    """Put the SDK & its bundled libraries (ndb, endpoints, protorpc)
+    on sys.path."""
+    sys.path.insert(0, sdk)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+
+def _makeForms(items):
+    """Return ConferenceForms with items made-up conferences."""
+    from google.appengine.ext import ndb
+    from models import ConferenceForm
+    from models import ConferenceForms
+
+    rand = random.Random(0)
+    forms = []
+    for i in range(items):
+        email = 'organizer%d@example.com' % rand.randrange(items // 10 + 1)
+        start = date(2015, 1, 1) + timedelta(days=rand.randrange(365))
+        max_attendees = rand.randrange(10, 1000)
+        words = [''.join(rand.choice(string.ascii_lowercase)
+                         for _ in range(rand.randrange(3, 10)))
+                 for _ in range(rand.randrange(5, 30))]
+        forms.append(ConferenceForm(
+            name='Conference %d' % i,
+            description=' '.join(words).capitalize(),
+            organizerUserId=email,
+            topics=rand.sample(TOPICS, rand.randrange(1, 4)),
+            city=rand.choice(CITIES),
+            startDate=str(start),
+            month=start.month,
+            maxAttendees=max_attendees,
+            seatsAvailable=rand.randrange(max_attendees + 1),
+            endDate=str(start + timedelta(days=rand.randrange(4))),
+            websafeKey=ndb.Key('Profile', email, 'Conference', i + 1,
+                               app='s~conference-central').urlsafe(),
+            organizerDisplayName=email.split('@')[0].capitalize(),
+        ))
+    return ConferenceForms(items=forms, nextPageToken='x' * 40)
+
+
+def _best(func):
+    """Return (result, best seconds) of REPEAT calls of func."""
+    best = None
+    for _ in range(REPEAT):
+        started = time.time()
+        result = func()
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def _gzipped(data):
+    """Return length of data gzipped, as a client accepting gzip gets it."""
+    buf = StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(data)
+    return len(buf.getvalue())
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit(__doc__)
+    _fixSysPath(argv[1])
+    items = int(argv[2]) if len(argv) > 2 else ITEMS
+
+    from protorpc import protobuf
+    from protorpc import protojson
+    from conference import ConferenceApi
+    from models import ConferenceColumns
+    from models import ConferenceForms
+
+    api = ConferenceApi()
+    forms = _makeForms(items)
+    columns = api._copyFormsToColumns(forms)
+
+    # ConferenceColumns encode time includes copying the forms over, as
+    # the server does for every columnar response
+    cases = (
+        ('JSON ConferenceForms', ConferenceForms, protojson,
+            lambda: protojson.encode_message(forms)),
+        ('JSON ConferenceColumns', ConferenceColumns, protojson,
+            lambda: protojson.encode_message(api._copyFormsToColumns(forms))),
+        ('protobuf ConferenceForms', ConferenceForms, protobuf,
+            lambda: protobuf.encode_message(forms)),
+        ('protobuf ConferenceColumns', ConferenceColumns, protobuf,
+            lambda: protobuf.encode_message(api._copyFormsToColumns(forms))),
+    )
+
+    print '%d conferences, best of %d runs' % (items, REPEAT)
+    print '%-28s %10s %10s %10s %10s' % ('', 'bytes', 'gzipped', 'encode ms', 'decode ms')
+    for label, message_type, protocol, encode in cases:
+        data, encode_time = _best(encode)
+        decoded, decode_time = _best(lambda: protocol.decode_message(message_type, data))
+        expected = forms if message_type is ConferenceForms else columns
+        # compare as JSON; decoded messages don't compare equal field by field
+        assert protojson.encode_message(decoded) == protojson.encode_message(expected), \
+            '%s did not round-trip' % label
+        print '%-28s %10d %10d %10.1f %10.1f' % (label, len(data), _gzipped(data),
+            1000 * encode_time, 1000 * decode_time)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+"""query_latency_benchmark.py
+
+Udacity conference server-side Python App Engine queryConferences
+latency benchmark; time & datastore RPCs to answer one page of
+conferences with organiser displayNames, the way queryConferences used
+to (the query run twice around a blocking Profile get_multi) and through
+today's single-pass tasklet pipeline, against the testbed stubs.
+
+usage: python query_latency_benchmark.py SDK_PATH [ITEMS]
+
+SDK_PATH is the App Engine Python SDK (the directory holding
+dev_appserver.py). The testbed stubs answer RPCs in-process, so time
+spent waiting on the network, which the pipeline overlaps, isn't in the
+timings; the RPC counts are.
+
+"""
+
+import logging
+import os
+import sys
+import time
+from datetime import date
+from datetime import timedelta
+
+# conferences, all on the one page (at most MAX_PAGE_SIZE)
+ITEMS = 100
+# conferences per organiser
+CONFERENCES_PER_ORGANIZER = 5
+# timings are the best of REPEAT runs
+REPEAT = 5
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CITIES = ('London', 'Paris', 'Chicago', 'Tokyo', 'San Francisco',
+          'Berlin', 'Sydney', 'Toronto', 'Kiev', 'Mumbai')
+
+
+def _fixSysPath(sdk):
+    """Put the SDK & its bundled libraries (ndb, endpoints, protorpc)
+    on sys.path."""
+    sys.path.insert(0, sdk)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+
+def _setUpTestbed():
+    """Activate the stubs ConferenceApi uses; return testbed."""
+    from google.appengine.datastore import datastore_stub_util
+    from google.appengine.ext import testbed
+
+    tb = testbed.Testbed()
+    tb.activate()
+    # endpoints.api_server() wants a 'major.minor' version
+    tb.setup_env(current_version_id='v1.1', overwrite=True)
+    # queries see every committed write
+    tb.init_datastore_v3_stub(consistency_policy=
+        datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1))
+    tb.init_memcache_stub()
+    tb.init_taskqueue_stub(root_path=HERE)
+    return tb
+
+
+def _makeConferences(items):
+    """Put items made-up Conferences & their organisers' Profiles; like
+    conferences written before displayNames were stored with them, they
+    have no organizerDisplayName."""
+    from google.appengine.ext import ndb
+    from models import Conference
+    from models import Profile
+
+    entities = []
+    for i in range(items):
+        email = 'organizer%d@example.com' % (i // CONFERENCES_PER_ORGANIZER)
+        p_key = ndb.Key(Profile, email)
+        if i % CONFERENCES_PER_ORGANIZER == 0:
+            entities.append(Profile(key=p_key, displayName='Organizer %d' % i,
+                mainEmail=email))
+        start = date(2015, 1, 1) + timedelta(days=i % 365)
+        entities.append(Conference(parent=p_key, name='Conference %03d' % i,
+            description='About conference %d' % i, organizerUserId=email,
+            topics=['Web Technologies'], city=CITIES[i % len(CITIES)],
+            startDate=start, month=start.month, endDate=start + timedelta(days=2),
+            maxAttendees=100, seatsAvailable=100))
+    ndb.put_multi(entities)
+
+
+def _queryBefore():
+    """queryConferences as it was: iterate the query for the organisers,
+    block on their Profiles, then iterate the query again for the forms."""
+    from google.appengine.ext import ndb
+    from conference import ConferenceApi
+    from models import Conference
+    from models import ConferenceForms
+    from models import Profile
+
+    api = ConferenceApi()
+    conferences = Conference.query().order(Conference.name)
+
+    # need to fetch organiser displayName from profiles
+    # get all keys and use get_multi for speed
+    organisers = [(ndb.Key(Profile, conf.organizerUserId)) for conf in conferences]
+    profiles = ndb.get_multi(organisers)
+
+    # put display names in a dict for easier fetching
+    names = {}
+    for profile in profiles:
+        names[profile.key.id()] = profile.displayName
+
+    # return individual ConferenceForm object per Conference
+    return ConferenceForms(
+            items=[api._copyConferenceToForm(conf, names[conf.organizerUserId]) for conf in \
+            conferences]
+    )
+
+
+def _queryAfter(items):
+    """queryConferences today, one page of items."""
+    from conference import ConferenceApi
+    from models import ConferenceQueryForms
+
+    return ConferenceApi()._queryConferences(ConferenceQueryForms(pageSize=items))
+
+
+def _forgetNames():
+    """Start with an instance that has resolved no displayNames yet."""
+    import conference
+    from displaynames import DisplayNameResolver
+
+    conference.DISPLAY_NAMES = DisplayNameResolver()
+
+
+def _best(func, reset):
+    """Return (result, best seconds, datastore RPCs) of REPEAT calls of
+    func, each after reset()."""
+    from google.appengine.api import apiproxy_stub_map
+
+    calls = []
+
+    def countCall(service, call, request, response):
+        calls.append(call)
+
+    hooks = apiproxy_stub_map.apiproxy.GetPreCallHooks()
+    hooks.Append('query_latency_benchmark', countCall, 'datastore_v3')
+    try:
+        best = None
+        for _ in range(REPEAT):
+            reset()
+            del calls[:]
+            started = time.time()
+            result = func()
+            elapsed = time.time() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best, len(calls)
+    finally:
+        hooks.Clear()
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit(__doc__)
+    _fixSysPath(argv[1])
+    items = int(argv[2]) if len(argv) > 2 else ITEMS
+    sys.path.insert(0, HERE)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    tb = _setUpTestbed()
+
+    from google.appengine.api import memcache
+    from google.appengine.ext import ndb
+    from protorpc import protojson
+
+    _makeConferences(items)
+
+    def cold():
+        # no cached query results, names or entities
+        memcache.flush_all()
+        ndb.get_context().clear_cache()
+        _forgetNames()
+
+    def warmNames():
+        # this instance resolved the organisers on an earlier request
+        memcache.flush_all()
+        ndb.get_context().clear_cache()
+
+    cases = (
+        ('before', _queryBefore, cold),
+        ('after, cold instance', lambda: _queryAfter(items), cold),
+        ('after, names cached', lambda: _queryAfter(items), warmNames),
+    )
+
+    print '%d conferences, %d organisers, best of %d runs' % (items,
+        (items + CONFERENCES_PER_ORGANIZER - 1) // CONFERENCES_PER_ORGANIZER, REPEAT)
+    print '%-24s %10s %16s' % ('', 'ms', 'datastore RPCs')
+    expected = None
+    for label, func, reset in cases:
+        forms, elapsed, rpcs = _best(func, reset)
+        # the pages must match, bar the page token
+        forms.nextPageToken = None
+        encoded = protojson.encode_message(forms)
+        assert expected is None or encoded == expected, '%s page differs' % label
+        expected = encoded
+        print '%-24s %10.1f %16d' % (label, 1000 * elapsed, rpcs)
+
+    tb.deactivate()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""registrations.py
+
+Udacity conference server-side Python App Engine conference
+registrations; one Registration entity per (conference, attendee),
+replacing the Profile.conferenceKeysToAttend list.
+
+"""
+
+from collections import Counter
+
+from google.appengine.ext import ndb
+
+from models import GroupBooking
+from models import Registration
+
+
+def registrationKey(p_key, wsck):
+    """Return key of a user's Registration for a conference."""
+    return ndb.Key(Registration, wsck, parent=p_key)
+
+
+def groupBookingKey(booker, wsck):
+    """Return key of the GroupBooking of a booker for a conference."""
+    return ndb.Key(GroupBooking, '%s|%s' % (booker, wsck))
+
+
+def releaseGroupBookings(wsck, regs):
+    """Return the GroupBookings of whoever booked regs (Registrations being
+    deleted) with those seats given back; put them in the same
+    transaction."""
+    released = Counter(reg.bookedBy for reg in regs if reg.bookedBy)
+    bookers = list(released)
+    bookings = ndb.get_multi([groupBookingKey(booker, wsck) for booker in bookers])
+    for booker, booking in zip(bookers, bookings):
+        if booking:
+            booking.seats = max(0, booking.seats - released[booker])
+    return [booking for booking in bookings if booking]
+
+
+def conferencesAttending(prof):
+    """Return websafe keys of conferences a user is registered for,
+    including any not yet moved out of Profile.conferenceKeysToAttend."""
+    reg_keys = Registration.query(ancestor=prof.key).fetch(keys_only=True)
+    return [key.id() for key in reg_keys] + list(prof.conferenceKeysToAttend)
+
+
+def attendeeKeys(conf_key):
+    """Return Profile keys of users registered for a conference."""
+    reg_keys = Registration.query(Registration.conferenceKey == conf_key).fetch(
+        keys_only=True)
+    return [key.parent() for key in reg_keys]
+
+
+def moveLegacyRegistrations(prof):
+    """Empty Profile.conferenceKeysToAttend, returning a Registration for
+    each conference it held; put both in the same transaction."""
+    regs = [Registration(key=registrationKey(prof.key, wsck),
+                         conferenceKey=ndb.Key(urlsafe=wsck))
+            for wsck in set(prof.conferenceKeysToAttend)]
+    prof.conferenceKeysToAttend = []
+    return regs
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""seat_contention.py
+
+Udacity conference server-side Python App Engine seat inventory check;
+runs hundreds of concurrent registrations (then unregistrations) for one
+conference against the testbed datastore stub and checks no seat is
+lost or sold twice, and that few (un)registrations fail on collisions.
+
+usage: python seat_contention.py SDK_PATH [REGISTRANTS] [SEATS]
+
+SDK_PATH is the App Engine Python SDK (the directory holding
+dev_appserver.py). Exits non-zero if the seat totals don't add up or
+more than MAX_FAILED_SHARE of either phase fails.
+
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# concurrent registrants, and seats they compete for
+REGISTRANTS = 300
+SEATS = 200
+# share of (un)registrations that may fail on transaction collisions
+MAX_FAILED_SHARE = 0.01
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _fixSysPath(sdk):
+    """Put the SDK & its bundled libraries (ndb, endpoints, protorpc)
+    on sys.path."""
+    sys.path.insert(0, sdk)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+
+def _setUpTestbed():
+    """Activate datastore, memcache & task queue stubs; return testbed."""
+    from google.appengine.datastore import datastore_stub_util
+    from google.appengine.ext import testbed
+
+    tb = testbed.Testbed()
+    tb.activate()
+    # endpoints.api_server() wants a 'major.minor' version
+    tb.setup_env(current_version_id='v1.1', overwrite=True)
+    # queries see every committed write, so totals are read back exactly
+    tb.init_datastore_v3_stub(consistency_policy=
+        datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1))
+    tb.init_memcache_stub()
+    tb.init_taskqueue_stub(root_path=HERE)
+    tb.init_user_stub()
+    return tb
+
+
+def _runConcurrently(func, users):
+    """Call func() once per user, each in its own thread signed in as that
+    user; return Counter of outcomes (True/False or exception class name)."""
+    import endpoints
+
+    signed_in = threading.local()
+    endpoints.get_current_user = lambda: signed_in.user
+    outcomes = Counter()
+    lock = threading.Lock()
+    start = threading.Event()
+
+    def run(user):
+        signed_in.user = user
+        start.wait()
+        try:
+            outcome = func().data
+        except Exception as e:
+            outcome = type(e).__name__
+        with lock:
+            outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=run, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def _check(label, conf_key, seats, expected):
+    """Print & check the seat totals; return True if they add up and
+    expected users are registered."""
+    from google.appengine.ext import ndb
+    from conference import ConferenceApi
+    from models import Registration
+    from seats import countSeats
+
+    # the registrations wrote from other threads' contexts
+    ndb.get_context().clear_cache()
+    ConferenceApi._syncSeatsAvailable(conf_key)
+    conf = conf_key.get()
+    registered = Registration.query(Registration.conferenceKey == conf_key).count()
+    left = countSeats(conf_key, conf.seatShards)
+    ok = registered == expected and registered + left == seats \
+        and conf.seatsAvailable == left
+    print '%-14s registered %4d + seats left %4d = %4d of %d; seatsAvailable %d: %s' % (
+        label, registered, left, registered + left, seats, conf.seatsAvailable,
+        'ok' if ok else 'MISMATCH')
+    return ok
+
+
+def _checkFailures(label, outcomes, registrants):
+    """Print & check how many calls failed on collisions (anything but a
+    result or sold out); return True if within MAX_FAILED_SHARE."""
+    failed = sum(count for outcome, count in outcomes.items()
+                 if outcome not in (True, False, 'ConflictException'))
+    ok = failed <= MAX_FAILED_SHARE * registrants
+    print '%-14s failed %4d of %d: %s' % (label, failed, registrants,
+        'ok' if ok else 'TOO MANY')
+    return ok
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit(__doc__)
+    _fixSysPath(argv[1])
+    registrants = int(argv[2]) if len(argv) > 2 else REGISTRANTS
+    seats = int(argv[3]) if len(argv) > 3 else SEATS
+    sys.path.insert(0, HERE)
+    # ndb logs every transaction collision
+    logging.getLogger().setLevel(logging.ERROR)
+    tb = _setUpTestbed()
+
+    from google.appengine.api import users
+    from google.appengine.ext import ndb
+    from conference import CONF_GET_REQUEST
+    from conference import ConferenceApi
+    from models import Conference
+    from models import Profile
+
+    p_key = ndb.Key(Profile, 'organizer@example.com')
+    conf_key = Conference(parent=p_key, name='Contended', organizerUserId=p_key.id(),
+        maxAttendees=seats, seatsAvailable=seats).put()
+    request = CONF_GET_REQUEST.combined_message_class(
+        websafeConferenceKey=conf_key.urlsafe())
+    attendees = [users.User('attendee%d@example.com' % i) for i in range(registrants)]
+    api = ConferenceApi()
+
+    print '%d registrants, %d seats' % (registrants, seats)
+    started = time.time()
+    outcomes = _runConcurrently(lambda: api._conferenceRegistration(request), attendees)
+    print 'register       %s in %.1fs' % (dict(outcomes), time.time() - started)
+    # collisions that outlast the retries fail, like they would for users
+    registered = outcomes[True]
+    ok = _check('registered', conf_key, seats, registered)
+    ok = _checkFailures('registered', outcomes, registrants) and ok
+
+    started = time.time()
+    outcomes = _runConcurrently(
+        lambda: api._conferenceRegistration(request, reg=False), attendees)
+    print 'unregister     %s in %.1fs' % (dict(outcomes), time.time() - started)
+    ok = _check('unregistered', conf_key, seats, registered - outcomes[True]) and ok
+    ok = _checkFailures('unregistered', outcomes, registrants) and ok
+
+    tb.deactivate()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""seats.py
+
+Udacity conference server-side Python App Engine seat inventory, split
+over sharded counter entities (each its own entity group) so concurrent
+registrations for one conference don't all write the same entity.
+
+"""
+
+import random
+
+from google.appengine.ext import ndb
+
+from models import SeatShard
+
+# counter shards a conference's seats are split over
+SEAT_SHARDS = 10
+
+
+def seatShardKeys(conf_key, shards=SEAT_SHARDS):
+    """Return keys of every seat shard of a conference."""
+    return [ndb.Key(SeatShard, '%s|%d' % (conf_key.urlsafe(), shard))
+            for shard in range(shards)]
+
+
+def splitSeats(conf_key, seats, shards=SEAT_SHARDS):
+    """Return new SeatShard entities holding seats between them."""
+    return [SeatShard(key=key, seats=seats // shards + (1 if i < seats % shards else 0))
+            for i, key in enumerate(seatShardKeys(conf_key, shards))]
+
+
+def seatsByShard(conf_key, shards):
+    """Return {shard key: seats} for a conference's seat shards."""
+    keys = seatShardKeys(conf_key, shards)
+    return dict((key, shard.seats if shard else 0)
+                for key, shard in zip(keys, ndb.get_multi(keys)))
+
+
+def countSeats(conf_key, shards):
+    """Return total seats left across a conference's seat shards."""
+    return max(0, sum(seatsByShard(conf_key, shards).values()))
+
+
+def claimOrder(conf_key, shards):
+    """Return keys of the shards with seats left, in random order, to try
+    claims against; an empty list means the conference is sold out."""
+    keys = [key for key, seats in seatsByShard(conf_key, shards).items() if seats > 0]
+    random.shuffle(keys)
+    return keys
+
+
+@ndb.transactional
+def _addSeats(shard_key, delta):
+    """Add delta seats to one shard, never taking it below zero; return
+    the delta applied."""
+    shard = shard_key.get() or SeatShard(key=shard_key)
+    delta = max(delta, -shard.seats)
+    if delta:
+        shard.seats += delta
+        shard.put()
+    return delta
+
+
+def addSeats(conf_key, shards, delta):
+    """Add (or with a negative delta, withdraw as far as there are any
+    left) seats to a conference's inventory."""
+    if delta > 0:
+        _addSeats(random.choice(seatShardKeys(conf_key, shards)), delta)
+        return
+    for key in claimOrder(conf_key, shards):
+        delta -= _addSeats(key, delta)
+        if not delta:
+            return
@@ -352,7 +352,20 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      * @returns {number}
      */
     $scope.pagination.numberOfPages = function () {
-        return Math.ceil($scope.conferences.length / $scope.pagination.pageSize);
+        var loaded = Math.ceil($scope.conferences.length / $scope.pagination.pageSize);
+        // One more page to move to while the server has more.
+        return $scope.pagination.nextPageToken ? loaded + 1 : loaded;
+    };
+
+    /**
+     * Fetches the next page of conferences if the current page is past the ones loaded.
+     */
+    $scope.pagination.loadMore = function () {
+        var pagination = $scope.pagination;
+        if (pagination.nextPageToken && !$scope.loading &&
+                pagination.currentPage * pagination.pageSize >= $scope.conferences.length) {
+            $scope.queryConferencesPage(pagination.nextPageToken);
+        }
     };
 
     /**
@@ -414,6 +427,9 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      */
     $scope.queryConferences = function () {
         $scope.submitted = false;
+        // Only the ALL tab pages through its results.
+        $scope.pagination.query = undefined;
+        $scope.pagination.nextPageToken = undefined;
         if ($scope.selectedTab == 'ALL') {
             $scope.queryConferencesAll();
         } else if ($scope.selectedTab == 'YOU_HAVE_CREATED') {
@@ -424,11 +440,13 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
     };
 
     /**
-     * Invokes the conference.queryConferences API.
+     * Invokes the conference.queryConferences API for the first page; later
+     * pages are fetched as the pager moves past what is loaded.
      */
     $scope.queryConferencesAll = function () {
         var sendFilters = {
-            filters: []
+            filters: [],
+            pageSize: $scope.pagination.pageSize
         }
         for (var i = 0; i < $scope.filters.length; i++) {
             var filter = $scope.filters[i];
@@ -440,33 +458,57 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
                 });
             }
         }
+        $scope.conferences = [];
+        $scope.pagination.currentPage = 0;
+        $scope.pagination.query = sendFilters;
+        $scope.queryConferencesPage(undefined);
+    }
+
+    /**
+     * Invokes the conference.queryConferences API for one page of the current query
+     * and appends it to $scope.conferences.
+     *
+     * @param pageToken the nextPageToken of the previous page, undefined for the first.
+     */
+    $scope.queryConferencesPage = function (pageToken) {
+        var sendFilters = $scope.pagination.query;
+        sendFilters.pageToken = pageToken;
         $scope.loading = true;
         gapi.client.conference.queryConferences(sendFilters).
             execute(function (resp) {
                 $scope.$apply(function () {
+                    // Another query (or tab) replaced this one meanwhile.
+                    if (sendFilters !== $scope.pagination.query) {
+                        return;
+                    }
                     $scope.loading = false;
                     if (resp.error) {
                         // The request has failed.
                         var errorMessage = resp.error.message || '';
                         $scope.messages = 'Failed to query conferences : ' + errorMessage;
                         $scope.alertStatus = 'warning';
-                        $log.error($scope.messages + ' filters : ' + JSON.stringify(sendFilters));
+                        $log.error($scope.messages + ' filters : ' + JSON.stringify(sendFilters.filters));
                     } else {
                         // The request has succeeded.
-                        $scope.submitted = false;
-                        $scope.messages = 'Query succeeded : ' + JSON.stringify(sendFilters);
-                        $scope.alertStatus = 'success';
-                        $log.info($scope.messages);
-
-                        $scope.conferences = [];
                         angular.forEach(resp.items, function (conference) {
                             $scope.conferences.push(conference);
                         });
+                        $scope.pagination.nextPageToken = resp.nextPageToken;
+                        $scope.submitted = false;
+                        $scope.messages = 'Query succeeded : ' + JSON.stringify({filters: sendFilters.filters});
+                        $scope.alertStatus = 'success';
+                        $log.info($scope.messages);
+                        // The pager may have moved on while this page was loading.
+                        $scope.pagination.loadMore();
                     }
                     $scope.submitted = true;
                 });
             });
-    }
+    };
+
+    $scope.$watch('pagination.currentPage', function () {
+        $scope.pagination.loadMore();
+    });
 
     /**
      * Invokes the conference.getConferencesCreated method.
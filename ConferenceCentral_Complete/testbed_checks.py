@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+
+"""testbed_checks.py
+
+Udacity conference server-side Python App Engine regression checks, run
+through ConferenceApi against the testbed stubs (datastore, memcache,
+task queue); each check starts from an empty datastore and prints ok or
+FAILED.
+
+usage: python testbed_checks.py SDK_PATH [CHECK ...]
+
+SDK_PATH is the App Engine Python SDK (the directory holding
+dev_appserver.py). Runs every check unless some are named; exits
+non-zero if any fails.
+
+"""
+
+import logging
+import os
+import sys
+import traceback
+import urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ORGANIZER = 'organizer@example.com'
+
+# checks in the order they run; see @check
+CHECKS = []
+
+
+def check(func):
+    """Register a check; it raises AssertionError when it fails."""
+    CHECKS.append(func)
+    return func
+
+
+def _fixSysPath(sdk):
+    """Put the SDK & its bundled libraries (ndb, endpoints, protorpc)
+    on sys.path."""
+    sys.path.insert(0, sdk)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+
+def _setUpTestbed():
+    """Activate the stubs ConferenceApi uses; return testbed."""
+    from google.appengine.datastore import datastore_stub_util
+    from google.appengine.ext import ndb
+    from google.appengine.ext import testbed
+
+    tb = testbed.Testbed()
+    tb.activate()
+    # endpoints.api_server() wants a 'major.minor' version
+    tb.setup_env(current_version_id='v1.1', overwrite=True)
+    # queries see every committed write
+    tb.init_datastore_v3_stub(consistency_policy=
+        datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1))
+    tb.init_memcache_stub()
+    tb.init_taskqueue_stub(root_path=HERE)
+    tb.init_mail_stub()
+    tb.init_user_stub()
+    tb.init_app_identity_stub()
+    ndb.get_context().clear_cache()
+    return tb
+
+
+def _signIn(email):
+    """Make endpoints.get_current_user() return email's user."""
+    import endpoints
+    from google.appengine.api import users
+
+    user = users.User(email)
+    endpoints.get_current_user = lambda: user
+
+
+def _runTasks(tb):
+    """Run queued push tasks through main.app until none are left."""
+    import main
+
+    stub = tb.get_stub('taskqueue')
+    while True:
+        tasks = stub.get_filtered_tasks(queue_names=['default'])
+        if not tasks:
+            return
+        stub.FlushQueue('default')
+        for task in tasks:
+            response = main.app.get_response(task.url, method='POST',
+                POST=dict(urlparse.parse_qsl(task.payload)))
+            assert response.status_int == 200, '%s: %s' % (task.url, response.status)
+
+
+def _createConference(**fields):
+    """Create a conference as ORGANIZER; return its websafe key."""
+    from google.appengine.ext import ndb
+    from conference import ConferenceApi
+    from models import Conference
+    from models import ConferenceForm
+
+    _signIn(ORGANIZER)
+    ConferenceApi()._createConferenceObject(ConferenceForm(**fields))
+    ndb.get_context().clear_cache()
+    confs = Conference.query(Conference.name == fields['name']).fetch()
+    return confs[0].key.urlsafe()
+
+
+def _updateConference(wsck, **fields):
+    """Update a conference as ORGANIZER."""
+    from conference import CONF_POST_REQUEST
+    from conference import ConferenceApi
+
+    _signIn(ORGANIZER)
+    ConferenceApi()._updateConferenceObject(
+        CONF_POST_REQUEST.combined_message_class(websafeConferenceKey=wsck, **fields))
+
+
+def _queryNames(filters, page_size=20):
+    """Run queryConferences page by page for (field, operator, value)
+    filters; return the names on each page."""
+    from google.appengine.ext import ndb
+    from conference import ConferenceApi
+    from models import ConferenceQueryForm
+    from models import ConferenceQueryForms
+
+    forms = []
+    for field, operator, value in filters:
+        if isinstance(value, list):
+            forms.append(ConferenceQueryForm(field=field, operator=operator, values=value))
+        else:
+            forms.append(ConferenceQueryForm(field=field, operator=operator, value=value))
+    pages = []
+    token = None
+    while True:
+        ndb.get_context().clear_cache()
+        result = ConferenceApi()._queryConferences(ConferenceQueryForms(
+            filters=forms, pageSize=page_size, pageToken=token))
+        pages.append([form.name for form in result.items])
+        token = result.nextPageToken
+        if not token:
+            return pages
+
+
+@check
+def updateMovesFacetCounts(tb):
+    """Moving a conference from Paris to Rome moves the city counts."""
+    from facets import getFacetCounts
+
+    wsck = _createConference(name='Moving', city='Paris')
+    _runTasks(tb)
+    _updateConference(wsck, city='Rome')
+    _runTasks(tb)
+    counts = getFacetCounts([('city', 'Paris'), ('city', 'Rome')])
+    assert counts == {('city', 'Paris'): 0, ('city', 'Rome'): 1}, counts
+
+
+@check
+def maxAttendeesResizesSeats(tb):
+    """Raising maxAttendees after a registration adds the difference to
+    the seat shards."""
+    from google.appengine.ext import ndb
+    from conference import CONF_GET_REQUEST
+    from conference import ConferenceApi
+    from seats import countSeats
+
+    wsck = _createConference(name='Growing', maxAttendees=10)
+    _signIn('attendee@example.com')
+    ConferenceApi()._conferenceRegistration(
+        CONF_GET_REQUEST.combined_message_class(websafeConferenceKey=wsck))
+    _updateConference(wsck, maxAttendees=20)
+    _runTasks(tb)
+    ndb.get_context().clear_cache()
+    conf = ndb.Key(urlsafe=wsck).get()
+    seats = countSeats(conf.key, conf.seatShards)
+    assert (conf.maxAttendees, seats, conf.seatsAvailable) == (20, 19, 19), \
+        (conf.maxAttendees, seats, conf.seatsAvailable)
+
+
+@check
+def notEqualPagesThrough(tb):
+    """NE filters page with cursors like any other filter."""
+    for i, city in enumerate(['Paris', 'Rome', 'Oslo', 'Paris', 'Lima']):
+        _createConference(name='Conf %d' % i, city=city,
+            startDate='2015-%02d-01' % (i + 1))
+    pages = _queryNames([('CITY', 'NE', 'Paris')], page_size=2)
+    assert pages == [['Conf 1', 'Conf 2'], ['Conf 4']], pages
+    pages = _queryNames([('MONTH', 'NE', '3'), ('CITY', 'EQ', 'Paris')])
+    assert pages == [['Conf 0', 'Conf 3']], pages
+
+
+@check
+def openEndedDateFilters(tb):
+    """A date filter that bounds no window runs in the datastore."""
+    for i in range(4):
+        _createConference(name='Conf %d' % i, startDate='2015-%02d-01' % (i + 1),
+            endDate='2015-%02d-03' % (i + 1))
+    pages = _queryNames([('START_DATE', 'GT', '2015-02-01')])
+    assert pages == [['Conf 2', 'Conf 3']], pages
+    pages = _queryNames([('END_DATE', 'LT', '2015-02-03')])
+    assert pages == [['Conf 0']], pages
+
+
+@check
+def inFiltersOrderedByName(tb):
+    """Every IN query pages through its matches in name order."""
+    # created in reverse name order, so key order is wrong
+    for i, (city, month) in enumerate([('Paris', 3), ('Rome', 4), ('Paris', 4),
+                                       ('Oslo', 3), ('Rome', 3)]):
+        _createConference(name='Conf %d' % (4 - i), city=city, topics=['Web'],
+            startDate='2015-%02d-01' % month, endDate='2015-%02d-02' % month)
+    pages = _queryNames([('CITY', 'IN', ['Paris', 'Rome'])], page_size=2)
+    assert pages == [['Conf 0', 'Conf 2'], ['Conf 3', 'Conf 4']], pages
+    pages = _queryNames([('MONTH', 'IN', ['3', '4'])], page_size=2)
+    assert pages == [['Conf 0', 'Conf 1'], ['Conf 2', 'Conf 3'], ['Conf 4']], pages
+    pages = _queryNames([('CITY', 'IN', ['Oslo', 'Rome']), ('TOPIC', 'EQ', 'Web')],
+        page_size=2)
+    assert pages == [['Conf 0', 'Conf 1'], ['Conf 3']], pages
+    pages = _queryNames([('CITY', 'IN', ['Paris', 'Oslo']),
+        ('START_DATE', 'GTEQ', '2015-03-01'), ('END_DATE', 'LTEQ', '2015-03-31')])
+    assert pages == [['Conf 1', 'Conf 4']], pages
+
+
+@check
+def searchFollowsEdits(tb):
+    """Renaming a conference moves it between search terms."""
+    from textsearch import findConferences
+
+    wsck = _createConference(name='Python Summit', description='Snakes')
+    _runTasks(tb)
+    assert [k.urlsafe() for k in findConferences('python')] == [wsck]
+    _updateConference(wsck, name='Ruby Summit')
+    _runTasks(tb)
+    assert findConferences('python') == []
+    assert [k.urlsafe() for k in findConferences('ruby snakes')] == [wsck]
+
+
+@check
+def organizerListsAttendees(tb):
+    """The organizer, and only the organizer, sees who registered."""
+    import endpoints
+    from conference import CONF_GET_REQUEST
+    from conference import ConferenceApi
+
+    wsck = _createConference(name='Listed', maxAttendees=10)
+    request = CONF_GET_REQUEST.combined_message_class(websafeConferenceKey=wsck)
+    for email in ('b@example.com', 'a@example.com'):
+        _signIn(email)
+        ConferenceApi()._conferenceRegistration(request)
+    try:
+        ConferenceApi().getConferenceAttendees(request)
+        assert False, 'an attendee listed the attendees'
+    except endpoints.ForbiddenException:
+        pass
+    _signIn(ORGANIZER)
+    emails = sorted(form.mainEmail for form in
+        ConferenceApi().getConferenceAttendees(request).items)
+    assert emails == ['a@example.com', 'b@example.com'], emails
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit(__doc__)
+    _fixSysPath(argv[1])
+    sys.path.insert(0, HERE)
+    # ndb logs every exception a transaction raises
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    names = argv[2:]
+    failed = 0
+    for func in CHECKS:
+        if names and func.__name__ not in names:
+            continue
+        tb = _setUpTestbed()
+        try:
+            func(tb)
+            print '%-40s ok' % func.__name__
+        except Exception:
+            failed += 1
+            print '%-40s FAILED' % func.__name__
+            traceback.print_exc()
+        finally:
+            tb.deactivate()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
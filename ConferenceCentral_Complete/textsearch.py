@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+"""textsearch.py
+
+Udacity conference server-side Python App Engine full-text search over
+Conference name, description & topics; a tokenized inverted index kept
+in datastore posting lists, so it needs no search service.
+
+"""
+
+import re
+import zlib
+from collections import defaultdict
+
+from google.appengine.ext import ndb
+
+from models import SearchDocument
+from models import SearchPosting
+from models import SearchPostingLane
+
+# lanes per term posting list, to spread concurrent index writes;
+# conferences are spread over them by key
+POSTING_SHARDS = 4
+# postings per SearchPosting chunk; a lane starts a new chunk when its
+# last is full, keeping entities well under the 1 MB limit
+MAX_POSTINGS_PER_SHARD = 5000
+# relevance weight of a term occurrence in each Conference field
+FIELD_WEIGHTS = (('name', 3), ('topics', 2), ('description', 1))
+# prefix matches rank below whole-term matches
+PREFIX_WEIGHT = 0.5
+# most index terms a single query token may expand to
+MAX_PREFIX_TERMS = 50
+
+STOP_WORDS = frozenset(('a', 'an', 'and', 'at', 'for', 'in', 'of', 'on',
+                        'or', 'the', 'to', 'with'))
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# sorts after every other character, to bound prefix range queries
+MAX_CHAR = u'\ufffd'
+
+
+def tokenize(text):
+    """Return lowercased index terms in text."""
+    if not text:
+        return []
+    return [token for token in TOKEN_RE.findall(text.lower())
+            if token not in STOP_WORDS]
+
+
+def _termWeights(conf):
+    """Return {term: weight} for a Conference."""
+    weights = defaultdict(int)
+    for field, weight in FIELD_WEIGHTS:
+        value = getattr(conf, field)
+        for text in (value if isinstance(value, list) else [value]):
+            for term in tokenize(text):
+                weights[term] += weight
+    return weights
+
+
+def _lane(conf_key):
+    """Return the posting list lane of conf_key."""
+    return zlib.crc32(conf_key.urlsafe()) % POSTING_SHARDS
+
+
+@ndb.transactional(xg=True)
+def _addPosting(term, conf_key, weight):
+    """Add conf_key to the last chunk of its lane of term's posting list,
+    starting a new chunk if that is full; return the chunk's key."""
+    lane_key = ndb.Key(SearchPostingLane, u'%s|%d' % (term, _lane(conf_key)))
+    lane = lane_key.get()
+    if not lane:
+        lane = SearchPostingLane(key=lane_key)
+        lane.put()
+    posting_key = ndb.Key(SearchPosting, u'%s|%d' % (lane_key.id(), lane.chunks - 1))
+    posting = posting_key.get() or SearchPosting(key=posting_key, term=term)
+
+    # a retried index task may already have added it
+    if conf_key in posting.conferenceKeys:
+        posting.weights[posting.conferenceKeys.index(conf_key)] = weight
+    else:
+        if len(posting.conferenceKeys) >= MAX_POSTINGS_PER_SHARD:
+            lane.chunks += 1
+            lane.put()
+            posting_key = ndb.Key(SearchPosting, u'%s|%d' % (lane_key.id(), lane.chunks - 1))
+            posting = SearchPosting(key=posting_key, term=term)
+        posting.conferenceKeys.append(conf_key)
+        posting.weights.append(weight)
+    posting.put()
+    return posting_key
+
+
+@ndb.transactional
+def _setPosting(posting_key, conf_key, weight):
+    """Change (or with weight 0, remove) conf_key's weight in one posting
+    list chunk."""
+    posting = posting_key.get()
+    if not posting:
+        return
+    pairs = dict(zip(posting.conferenceKeys, posting.weights))
+    if weight:
+        pairs[conf_key] = weight
+    else:
+        pairs.pop(conf_key, None)
+
+    if pairs:
+        posting.conferenceKeys = pairs.keys()
+        posting.weights = [pairs[k] for k in posting.conferenceKeys]
+        posting.put()
+    else:
+        posting_key.delete()
+
+
+def indexConference(conf_key):
+    """Bring index entries for one Conference up to date; idempotent, so
+    it can be retried from a task."""
+    conf = conf_key.get()
+    doc_key = ndb.Key(SearchDocument, conf_key.urlsafe())
+    doc = doc_key.get() or SearchDocument(key=doc_key)
+
+    new = _termWeights(conf) if conf else {}
+    old = dict(zip(doc.terms, doc.weights))
+    old_keys = dict(zip(doc.terms, doc.postingKeys))
+
+    posting_keys = {}
+    for term in set(old) | set(new):
+        weight = new.get(term, 0)
+        if term in old:
+            if old[term] != weight:
+                _setPosting(old_keys[term], conf_key, weight)
+            if weight:
+                posting_keys[term] = old_keys[term]
+        elif weight:
+            posting_keys[term] = _addPosting(term, conf_key, weight)
+
+    if posting_keys:
+        doc.terms = posting_keys.keys()
+        doc.weights = [new[term] for term in doc.terms]
+        doc.postingKeys = [posting_keys[term] for term in doc.terms]
+        doc.put()
+    else:
+        doc_key.delete()
+
+
+def findConferences(query):
+    """Return Conference keys matching every token of query (each as a
+    whole term or a prefix), best match first."""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    scores = None
+    for token in tokens:
+        # postings come in term order; stop at MAX_PREFIX_TERMS terms,
+        # however many chunks each has
+        postings = SearchPosting.query(SearchPosting.term >= token,
+                                       SearchPosting.term < token + MAX_CHAR)
+        token_scores = defaultdict(float)
+        terms = set()
+        for posting in postings:
+            if posting.term not in terms:
+                if len(terms) == MAX_PREFIX_TERMS:
+                    break
+                terms.add(posting.term)
+            factor = 1 if posting.term == token else PREFIX_WEIGHT
+            for conf_key, weight in zip(posting.conferenceKeys, posting.weights):
+                token_scores[conf_key] = max(token_scores[conf_key], weight * factor)
+
+        # every token must match
+        if scores is None:
+            scores = dict(token_scores)
+        else:
+            scores = dict((k, scores[k] + token_scores[k])
+                          for k in scores if k in token_scores)
+        if not scores:
+            return []
+
+    return sorted(scores, key=lambda k: (-scores[k], k))
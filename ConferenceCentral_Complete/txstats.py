@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""txstats.py
+
+Udacity conference server-side Python App Engine transaction
+instrumentation; runs transactions with its own collision retries
+(jittered backoff scaled by each key's observed contention) and keeps
+per-instance counters of attempts, collisions, commit latency & failures.
+
+"""
+
+import functools
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from google.appengine.api import datastore_errors
+from google.appengine.ext import ndb
+
+# attempts before a colliding transaction fails (ndb's default is 4)
+MAX_ATTEMPTS = 4
+# first retry waits up to BASE_BACKOFF seconds, doubling per attempt, up
+# to MAX_BACKOFF; a key that always collides waits CONTENTION_SCALE times
+# longer than one that never does
+BASE_BACKOFF = 0.01
+MAX_BACKOFF = 1.0
+CONTENTION_SCALE = 9
+# weight of the latest attempt in a key's collision rate
+CONTENTION_WEIGHT = 0.2
+# most keys counters are kept for per instance
+MAX_TRACKED_KEYS = 1000
+
+
+class _KeyStats(object):
+    """Counters for transactions on one key."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.collisions = 0
+        self.commits = 0
+        self.failures = 0
+        self.latency = 0.0          # total seconds of committed attempts
+        self.maxLatency = 0.0
+        self.contention = 0.0       # moving average of collisions per attempt
+
+    def toDict(self):
+        return {
+            'attempts': self.attempts,
+            'collisions': self.collisions,
+            'commits': self.commits,
+            'failures': self.failures,
+            'meanLatencyMs': int(1000 * self.latency / self.commits) if self.commits else 0,
+            'maxLatencyMs': int(1000 * self.maxLatency),
+            'contention': round(self.contention, 3),
+        }
+
+
+class TransactionStats(object):
+    """Run & count transactions per key (e.g. a websafe Conference key)."""
+
+    def __init__(self, size=MAX_TRACKED_KEYS):
+        self._size = size
+        self._lock = threading.Lock()
+        self._stats = OrderedDict()     # key -> _KeyStats, least recent first
+
+    def _record(self, key, collided=False, latency=None, failed=False):
+        """Count one attempt; return the key's contention afterwards."""
+        with self._lock:
+            stats = self._stats.pop(key, None) or _KeyStats()
+            self._stats[key] = stats
+            while len(self._stats) > self._size:
+                self._stats.popitem(last=False)
+            stats.attempts += 1
+            stats.contention += CONTENTION_WEIGHT * ((1 if collided else 0) - stats.contention)
+            if collided:
+                stats.collisions += 1
+            if failed:
+                stats.failures += 1
+            if latency is not None:
+                stats.commits += 1
+                stats.latency += latency
+                stats.maxLatency = max(stats.maxLatency, latency)
+            return stats.contention
+
+    def run(self, key, callback, xg=False):
+        """Run callback in a transaction, retrying collisions."""
+        # already in one: join it, like ndb.transactional
+        if ndb.in_transaction():
+            return callback()
+        for attempt in range(MAX_ATTEMPTS):
+            started = time.time()
+            try:
+                result = ndb.transaction(callback, retries=0, xg=xg)
+            except datastore_errors.TransactionFailedError:
+                failed = attempt == MAX_ATTEMPTS - 1
+                contention = self._record(key, collided=True, failed=failed)
+                if failed:
+                    raise
+                backoff = BASE_BACKOFF * 2 ** attempt * (1 + CONTENTION_SCALE * contention)
+                time.sleep(random.uniform(0, min(MAX_BACKOFF, backoff)))
+            except Exception:
+                self._record(key)
+                raise
+            else:
+                self._record(key, latency=time.time() - started)
+                return result
+
+    def snapshot(self):
+        """Return {key: counters} for every tracked key."""
+        with self._lock:
+            return dict((key, stats.toDict()) for key, stats in self._stats.items())
+
+
+# one set of counters per instance
+TRANSACTION_STATS = TransactionStats()
+
+
+def instrumentedTransactional(stats_key, xg=False):
+    """Decorator like ndb.transactional(xg=xg), counting the transaction
+    under stats_key(*args, **kwds)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwds):
+            return TRANSACTION_STATS.run(stats_key(*args, **kwds),
+                lambda: func(*args, **kwds), xg)
+        return wrapper
+    return decorator
@@ -1,4 +1,5 @@
 import json
+import operator
 import os
 import time
 import uuid
@@ -43,3 +44,24 @@ def getUserId(user, id_type="email"):
             return profile.id()
         else:
             return str(uuid.uuid1().get_hex())
+
+
+def copyPlan(model, message, converters=None, convert=None):
+    """Return [(field name, getter)] for copying a model entity to message.
+
+    Built once per (model, message) pair: fields named in converters use
+    that function of the entity; other message fields the model also has
+    are copied as they are, or passed through convert if given; the rest
+    are left unset.
+    """
+    converters = converters or {}
+    plan = []
+    for field in message.all_fields():
+        if field.name in converters:
+            plan.append((field.name, converters[field.name]))
+        elif hasattr(model, field.name):
+            get = operator.attrgetter(field.name)
+            if convert:
+                get = lambda entity, get=get: convert(get(entity))
+            plan.append((field.name, get))
+    return plan
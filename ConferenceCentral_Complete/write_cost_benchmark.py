@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+"""write_cost_benchmark.py
+
+Udacity conference server-side Python App Engine write cost benchmark;
+datastore write operations (entity plus index rows, as billed) to create
+a conference, register for it & resync its seatsAvailable, with the
+composite indexes of each given index.yaml, through ConferenceApi
+against the testbed datastore stub.
+
+usage: python write_cost_benchmark.py SDK_PATH [INDEX_YAML ...]
+
+SDK_PATH is the App Engine Python SDK (the directory holding
+dev_appserver.py). INDEX_YAML defaults to this directory's index.yaml;
+to compare with an older index set, e.g.
+
+    git show REV:ConferenceCentral_Complete/index.yaml > /tmp/old.yaml
+    python write_cost_benchmark.py SDK_PATH /tmp/old.yaml index.yaml
+
+"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+# registrations averaged over
+REGISTRATIONS = 20
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ORGANIZER = 'organizer@example.com'
+
+
+def _fixSysPath(sdk):
+    """Put the SDK & its bundled libraries (ndb, endpoints, protorpc)
+    on sys.path."""
+    sys.path.insert(0, sdk)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+
+def _setUpTestbed(index_dir):
+    """Activate the stubs ConferenceApi uses, the datastore's with the
+    composite indexes of index_dir's index.yaml; return testbed."""
+    from google.appengine.datastore import datastore_stub_util
+    from google.appengine.ext import ndb
+    from google.appengine.ext import testbed
+
+    tb = testbed.Testbed()
+    tb.activate()
+    # endpoints.api_server() wants a 'major.minor' version
+    tb.setup_env(current_version_id='v1.1', overwrite=True)
+    # require_indexes: leave index.yaml as it is
+    tb.init_datastore_v3_stub(root_path=index_dir, require_indexes=True,
+        consistency_policy=datastore_stub_util.PseudoRandomHRConsistencyPolicy(
+            probability=1))
+    tb.init_memcache_stub()
+    tb.init_taskqueue_stub(root_path=HERE)
+    tb.init_user_stub()
+    ndb.get_context().clear_cache()
+    return tb
+
+
+class _WriteCounter(object):
+    """Sums the write cost the datastore stub reports for puts & commits."""
+
+    def __init__(self):
+        self.writes = 0
+
+        # apiproxy hooks must be plain functions
+        def countWrites(service, call, request, response):
+            if call in ('Put', 'Commit'):
+                cost = response.cost()
+                self.writes += cost.entity_writes() + cost.index_writes()
+        self.hook = countWrites
+
+    def measure(self, func):
+        """Return writes made by func()."""
+        before = self.writes
+        func()
+        return self.writes - before
+
+
+def _signIn(email):
+    """Make endpoints.get_current_user() return email's user."""
+    import endpoints
+    from google.appengine.api import users
+
+    user = users.User(email)
+    endpoints.get_current_user = lambda: user
+
+
+def _compositeIndexes(index_yaml):
+    """Return the number of Conference composite indexes in index_yaml."""
+    from google.appengine.datastore import datastore_index
+
+    with open(index_yaml) as f:
+        definitions = datastore_index.ParseIndexDefinitions(f.read())
+    return len([index for index in definitions.indexes or []
+                if index.kind == 'Conference'])
+
+
+def _measure(index_yaml):
+    """Return writes (create conference, per registration, per seat
+    resync) with index_yaml's composite indexes."""
+    index_dir = tempfile.mkdtemp()
+    shutil.copy(index_yaml, os.path.join(index_dir, 'index.yaml'))
+    tb = _setUpTestbed(index_dir)
+    try:
+        from google.appengine.api import apiproxy_stub_map
+        from google.appengine.ext import ndb
+        from conference import CONF_GET_REQUEST
+        from conference import ConferenceApi
+        from models import Conference
+        from models import ConferenceForm
+
+        counter = _WriteCounter()
+        apiproxy_stub_map.apiproxy.GetPostCallHooks().Append(
+            'write_cost_benchmark', counter.hook, 'datastore_v3')
+        # the stub reads index.yaml when it runs its first query
+        Conference.query().count()
+
+        api = ConferenceApi()
+        _signIn(ORGANIZER)
+        create = counter.measure(lambda: api._createConferenceObject(ConferenceForm(
+            name='Write Cost', description='Where the index rows go',
+            topics=['Web Technologies', 'Cloud Computing'], city='London',
+            startDate='2015-06-01', endDate='2015-06-03', maxAttendees=100)))
+        conf_key = Conference.query(Conference.name == 'Write Cost').get().key
+        request = CONF_GET_REQUEST.combined_message_class(
+            websafeConferenceKey=conf_key.urlsafe())
+
+        register = resync = 0
+        for i in range(REGISTRATIONS):
+            _signIn('attendee%d@example.com' % i)
+            register += counter.measure(lambda: api._conferenceRegistration(request))
+            ndb.get_context().clear_cache()
+            resync += counter.measure(lambda: ConferenceApi._syncSeatsAvailable(conf_key))
+        return create, float(register) / REGISTRATIONS, float(resync) / REGISTRATIONS
+    finally:
+        apiproxy_stub_map.apiproxy.GetPostCallHooks().Clear()
+        tb.deactivate()
+        shutil.rmtree(index_dir)
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit(__doc__)
+    _fixSysPath(argv[1])
+    index_yamls = argv[2:] or [os.path.join(HERE, 'index.yaml')]
+    sys.path.insert(0, HERE)
+    # ndb logs every exception a transaction raises
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    print 'writes (entity + index rows), registrations averaged over %d' % REGISTRATIONS
+    print '%-24s %8s %8s %10s %8s %14s' % ('index.yaml', 'indexes', 'create',
+        'register', 'resync', 'per register')
+    for index_yaml in index_yamls:
+        create, register, resync = _measure(index_yaml)
+        # a registration's resync is shared with the others of its
+        # interval; per register counts the worst case, one each
+        print '%-24s %8d %8d %10.1f %8.1f %14.1f' % (os.path.basename(index_yaml)[-24:],
+            _compositeIndexes(index_yaml), create, register, resync, register + resync)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
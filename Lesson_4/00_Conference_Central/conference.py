@@ -25,6 +25,7 @@ from models import ProfileForm
 from models import TeeShirtSize
 from models import ConferenceForms
 from models import ConferenceQueryForms
+from utils import copyPlan
 from utils import getUserId
 from settings import WEB_CLIENT_ID
 from models import Conference
@@ -75,6 +76,27 @@ FIELDS =    {
             'MAX_ATTENDEES': 'maxAttendees',
             }
 
+# (field name, getter) plans for the *ToForm converters, built once
+CONFERENCE_COPY_PLAN = copyPlan(Conference, ConferenceForm, {
+    'startDate': lambda conf: str(conf.startDate),
+    'endDate': lambda conf: str(conf.endDate),
+    'websafeKey': lambda conf: conf.key.urlsafe(),
+})
+
+PROFILE_COPY_PLAN = copyPlan(Profile, ProfileForm, {
+    'teeShirtSize': lambda prof: getattr(TeeShirtSize, prof.teeShirtSize),
+})
+
+# conferenceName isn't in the plan: _copySessionToForm sets it from the
+# session's conference, which _copySessionsToForms fetches in one batch
+SESSION_COPY_PLAN = copyPlan(Session, SessionForm, {
+    'websafeKey': lambda session: session.key.urlsafe(),
+}, str)
+
+SPEAKER_COPY_PLAN = copyPlan(Speaker, SpeakerForm, {
+    'websafeKey': lambda speaker: speaker.key.urlsafe(),
+}, str)
+
 CONF_GET_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeConferenceKey=messages.StringField(1),
@@ -121,13 +143,8 @@ class ConferenceApi(remote.Service):
         """Copy relevant fields from Profile to ProfileForm."""
         # copy relevant fields from Profile to ProfileForm
         pf = ProfileForm()
-        for field in pf.all_fields():
-            if hasattr(prof, field.name):
-                # convert t-shirt string to Enum; just copy others
-                if field.name == 'teeShirtSize':
-                    setattr(pf, field.name, getattr(TeeShirtSize, getattr(prof, field.name)))
-                else:
-                    setattr(pf, field.name, getattr(prof, field.name))
+        for name, get in PROFILE_COPY_PLAN:
+            setattr(pf, name, get(prof))
         pf.check_initialized()
         return pf
 
@@ -191,15 +208,8 @@ class ConferenceApi(remote.Service):
     def _copyConferenceToForm(self, conf, displayName):
         """Copy relevant fields from Conference to ConferenceForm."""
         cf = ConferenceForm()
-        for field in cf.all_fields():
-            if hasattr(conf, field.name):
-                # convert Date to date string; just copy others
-                if field.name.endswith('Date'):
-                    setattr(cf, field.name, str(getattr(conf, field.name)))
-                else:
-                    setattr(cf, field.name, getattr(conf, field.name))
-            elif field.name == "websafeKey":
-                setattr(cf, field.name, conf.key.urlsafe())
+        for name, get in CONFERENCE_COPY_PLAN:
+            setattr(cf, name, get(conf))
         if displayName:
             setattr(cf, 'organizerDisplayName', displayName)
         cf.check_initialized()
@@ -588,12 +598,8 @@ class ConferenceApi(remote.Service):
 
     def _copySpeakerToForm(self, speaker):
         sf = SpeakerForm()
-        for field in sf.all_fields():
-            print "Field %s" % field.name
-            if hasattr(speaker, field.name):
-                setattr(sf, field.name, str(getattr(speaker, field.name)))
-            elif field.name == 'websafeKey':
-                setattr(sf, field.name, speaker.key.urlsafe())
+        for name, get in SPEAKER_COPY_PLAN:
+            setattr(sf, name, get(speaker))
         sf.check_initialized()
         return sf
 
@@ -635,24 +641,28 @@ class ConferenceApi(remote.Service):
 
 #!!!------ Sessions query
 ###############################
-    def _copySessionToForm(self, session):
+    def _copySessionToForm(self, session, conf=None):
         """Copy relevant fields from Session to SessionForm."""
         sf = SessionForm()
-        for field in sf.all_fields():
-            if hasattr(session, field.name):
-                setattr(sf, field.name, str(getattr(session, field.name)))
-            elif field.name == 'websafeKey':
-                setattr(sf, field.name, session.key.urlsafe())
-            elif field.name == 'speakerName':
-                setattr(sf, field.name,
-                        getattr(session.keySpeaker.get(), 'speakerName'))
-            elif field.name == 'conferenceName':
-                setattr(sf, field.name,
-                        getattr(session.conferenceKey.get(), 'name'))
+        for name, get in SESSION_COPY_PLAN:
+            setattr(sf, name, get(session))
+        # conference is looked up here unless the caller prefetched it
+        if conf is None and session.conferenceKey:
+            conf = session.conferenceKey.get()
+        setattr(sf, 'conferenceName', getattr(conf, 'name', None))
 
         sf.check_initialized()
         return sf
 
+    def _copySessionsToForms(self, sessions):
+        """Copy Sessions to SessionForms, fetching their conferences in one
+        batch instead of one get per session."""
+        sessions = [s for s in sessions if s]
+        conf_keys = list(set(s.conferenceKey for s in sessions if s.conferenceKey))
+        confs = dict(zip(conf_keys, ndb.get_multi(conf_keys)))
+        return [self._copySessionToForm(s, confs.get(s.conferenceKey))
+                for s in sessions]
+
 
     @endpoints.method(SESS_GET_REQUEST_CONF, SessionForms,
         path='getConferenceSessions', http_method='GET',
@@ -665,8 +675,7 @@ class ConferenceApi(remote.Service):
         sessions = Session.query(ancestor=c_key)
         # return set of SessionForm objects per Session
         return SessionForms(
-            items=[self._copySessionToForm(s)
-                   for s in sessions])
+            items=self._copySessionsToForms(sessions))
 
 
     @endpoints.method(SESS_GET_REQUEST_SPEAKER, SessionForms,
@@ -680,8 +689,7 @@ class ConferenceApi(remote.Service):
         sessions = Session.query(Session.keySpeaker==s_key)
         # return set of ConferenceForm objects per Conference
         return SessionForms(
-            items=[self._copySessionToForm(s)
-                   for s in sessions])
+            items=self._copySessionsToForms(sessions))
 
 
     @endpoints.method(SESS_GET_REQUEST_TYPE, SessionForms,
@@ -696,8 +704,7 @@ class ConferenceApi(remote.Service):
         sessions = sessions.filter(Session.typeOfSession==request.typeOfSession)
         # return set of SessionForm objects per Session
         return SessionForms(
-            items=[self._copySessionToForm(s)
-                   for s in sessions])
+            items=self._copySessionsToForms(sessions))
 
 
 
@@ -756,8 +763,7 @@ class ConferenceApi(remote.Service):
         sess_keys = set(sess_keys_user) & sess_keys_conf
         sessions = ndb.get_multi(sess_keys)
         return SessionForms(
-            items=[self._copySessionToForm(s)
-                   for s in sessions])
+            items=self._copySessionsToForms(sessions))
 
     @endpoints.method(SESS_GET_REQUEST, BooleanMessage,
                           path='sessions/deletefromwishlist',
@@ -776,7 +782,7 @@ class ConferenceApi(remote.Service):
                         if s.startTime < datetime.time(19, 0, 0)]
 
         return SessionForms(
-            items=[self._copySessionToForm(s) for s in new_sessions])
+            items=self._copySessionsToForms(new_sessions))
 
     @endpoints.method(SESS_GET_REQUEST_KEY, SessionForms,
                       path='getAtTheSameDay',
@@ -801,7 +807,7 @@ class ConferenceApi(remote.Service):
         sessions = sessions.filter(Session.date == date)
         sessions = sessions.filter(Session.sessionName != name)
         return SessionForms(
-            items=[self._copySessionToForm(s) for s in sessions])
+            items=self._copySessionsToForms(sessions))
 
 
     @endpoints.method(SESS_GET_REQUEST_CONF, SessionForms,
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+"""converter_benchmark.py
+
+Udacity conference server-side Python App Engine *ToForm converter
+benchmark; time to copy made-up Conferences, Profiles, Sessions &
+Speakers to their forms with the per-field reflection loops the
+converters used to run, and with the copy plans (utils.copyPlan) they
+apply now.
+
+usage: python converter_benchmark.py SDK_PATH [ITEMS]
+
+SDK_PATH is the App Engine Python SDK (the directory holding
+dev_appserver.py); no datastore is needed, the entities are made up.
+
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import date
+from datetime import time as daytime
+from datetime import timedelta
+
+# entities of each kind converted
+ITEMS = 10000
+# timings are the best of REPEAT runs
+REPEAT = 5
+
+APP_ID = 's~conference-central'
+CITIES = ('London', 'Paris', 'Chicago', 'Tokyo', 'San Francisco',
+          'Berlin', 'Sydney', 'Toronto', 'Kiev', 'Mumbai')
+TOPICS = ('Medical Innovations', 'Programming Languages', 'Web Technologies',
+          'Movie Making', 'Health and Nutrition', 'Cloud Computing')
+SESSION_TYPES = ('lecture', 'keynote', 'workshop')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _fixSysPath(sdk):
+    """Put the SDK & its bundled libraries (ndb, endpoints, protorpc)
+    on sys.path."""
+    sys.path.insert(0, sdk)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+
+def _makeEntities(items):
+    """Return made-up (conferences, profiles, sessions, speakers), items
+    of each; session i belongs to conference i."""
+    from google.appengine.ext import ndb
+    from models import Conference
+    from models import Profile
+    from models import Session
+    from models import Speaker
+
+    rand = random.Random(0)
+    conferences, profiles, sessions, speakers = [], [], [], []
+    for i in range(items):
+        email = 'user%d@example.com' % i
+        start = date(2015, 1, 1) + timedelta(days=rand.randrange(365))
+        max_attendees = rand.randrange(10, 1000)
+        conferences.append(Conference(
+            key=ndb.Key(Profile, email, Conference, i + 1, app=APP_ID),
+            name='Conference %d' % i,
+            description='About conference %d' % i,
+            organizerUserId=email,
+            topics=rand.sample(TOPICS, rand.randrange(1, 4)),
+            city=rand.choice(CITIES),
+            startDate=start,
+            month=start.month,
+            endDate=start + timedelta(days=rand.randrange(4)),
+            maxAttendees=max_attendees,
+            seatsAvailable=rand.randrange(max_attendees + 1),
+        ))
+        profiles.append(Profile(
+            key=ndb.Key(Profile, email, app=APP_ID),
+            displayName='User %d' % i,
+            mainEmail=email,
+            teeShirtSize=rand.choice(('NOT_SPECIFIED', 'M_M', 'L_W', 'XL_M')),
+            conferenceKeysToAttend=[conferences[-1].key.urlsafe()],
+        ))
+        speaker_key = ndb.Key(Speaker, email, app=APP_ID)
+        sessions.append(Session(
+            key=ndb.Key(Session, i + 1, parent=conferences[-1].key),
+            sessionName='Session %d' % i,
+            typeOfSession=rand.choice(SESSION_TYPES),
+            highlights='Highlights of session %d' % i,
+            duration='%dh' % rand.randrange(1, 4),
+            date=start,
+            startTime=daytime(rand.randrange(9, 18)),
+            conferenceKey=conferences[-1].key,
+            keySpeaker=speaker_key,
+        ))
+        speakers.append(Speaker(
+            key=speaker_key,
+            speakerEmail=email,
+            speakerName='Speaker %d' % i,
+            specialization=rand.choice(TOPICS),
+            currentWorkingPlace='Company %d' % rand.randrange(100),
+        ))
+    return conferences, profiles, sessions, speakers
+
+
+# the converters before copy plans, less _copySpeakerToForm's print of
+# every field name; the conference a session's name comes from is passed
+# in, as _copySessionsToForms prefetches it, instead of fetched per session
+
+def _reflectConference(conf, displayName=None):
+    from models import ConferenceForm
+
+    cf = ConferenceForm()
+    for field in cf.all_fields():
+        if hasattr(conf, field.name):
+            # convert Date to date string; just copy others
+            if field.name.endswith('Date'):
+                setattr(cf, field.name, str(getattr(conf, field.name)))
+            else:
+                setattr(cf, field.name, getattr(conf, field.name))
+        elif field.name == "websafeKey":
+            setattr(cf, field.name, conf.key.urlsafe())
+    if displayName:
+        setattr(cf, 'organizerDisplayName', displayName)
+    cf.check_initialized()
+    return cf
+
+
+def _reflectProfile(prof):
+    from models import ProfileForm
+    from models import TeeShirtSize
+
+    pf = ProfileForm()
+    for field in pf.all_fields():
+        if hasattr(prof, field.name):
+            # convert t-shirt string to Enum; just copy others
+            if field.name == 'teeShirtSize':
+                setattr(pf, field.name, getattr(TeeShirtSize, getattr(prof, field.name)))
+            else:
+                setattr(pf, field.name, getattr(prof, field.name))
+    pf.check_initialized()
+    return pf
+
+
+def _reflectSession(session, conf):
+    from models import SessionForm
+
+    sf = SessionForm()
+    for field in sf.all_fields():
+        if hasattr(session, field.name):
+            setattr(sf, field.name, str(getattr(session, field.name)))
+        elif field.name == 'websafeKey':
+            setattr(sf, field.name, session.key.urlsafe())
+        elif field.name == 'conferenceName':
+            setattr(sf, field.name, getattr(conf, 'name'))
+    sf.check_initialized()
+    return sf
+
+
+def _reflectSpeaker(speaker):
+    from models import SpeakerForm
+
+    sf = SpeakerForm()
+    for field in sf.all_fields():
+        if hasattr(speaker, field.name):
+            setattr(sf, field.name, str(getattr(speaker, field.name)))
+        elif field.name == 'websafeKey':
+            setattr(sf, field.name, speaker.key.urlsafe())
+    sf.check_initialized()
+    return sf
+
+
+def _best(func):
+    """Return (result, best seconds) of REPEAT calls of func."""
+    best = None
+    for _ in range(REPEAT):
+        started = time.time()
+        result = func()
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit(__doc__)
+    _fixSysPath(argv[1])
+    items = int(argv[2]) if len(argv) > 2 else ITEMS
+    sys.path.insert(0, HERE)
+
+    from protorpc import protojson
+    from conference import ConferenceApi
+
+    api = ConferenceApi()
+    conferences, profiles, sessions, speakers = _makeEntities(items)
+
+    cases = (
+        ('Conference', lambda: [_reflectConference(c, 'Organizer') for c in conferences],
+            lambda: [api._copyConferenceToForm(c, 'Organizer') for c in conferences]),
+        ('Profile', lambda: [_reflectProfile(p) for p in profiles],
+            lambda: [api._copyProfileToForm(p) for p in profiles]),
+        ('Session', lambda: [_reflectSession(s, c) for s, c in zip(sessions, conferences)],
+            lambda: [api._copySessionToForm(s, c) for s, c in zip(sessions, conferences)]),
+        ('Speaker', lambda: [_reflectSpeaker(s) for s in speakers],
+            lambda: [api._copySpeakerToForm(s) for s in speakers]),
+    )
+
+    print '%d entities of each kind, best of %d runs' % (items, REPEAT)
+    print '%-12s %12s %12s %8s' % ('', 'reflect ms', 'plan ms', 'speedup')
+    for label, reflect, plan in cases:
+        old, reflect_time = _best(reflect)
+        new, plan_time = _best(plan)
+        # compare as JSON; forms don't compare equal field by field
+        assert [protojson.encode_message(f) for f in old] == \
+            [protojson.encode_message(f) for f in new], '%s forms differ' % label
+        print '%-12s %12.1f %12.1f %7.1fx' % (label, 1000 * reflect_time,
+            1000 * plan_time, reflect_time / plan_time)
+
+
+if __name__ == '__main__':
+    main(sys.argv)